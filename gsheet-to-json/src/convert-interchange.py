@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+'''
+convert a document from json to msgpack or from msgpack to json, the formats are decided by the file extensions (.json/.msgpack)
+'''
+import time
+import argparse
+
+from helper.interchange import convert_document
+from helper.logger import *
+from helper import logger
+
+
+if __name__ == '__main__':
+	# construct the argument parse and parse the arguments
+	ap = argparse.ArgumentParser()
+	ap.add_argument("-i", "--input", required=True, help="the document to convert (.json or .msgpack)")
+	ap.add_argument("-o", "--output", required=True, help="the converted document (.json or .msgpack)")
+	ap.add_argument("--compact", required=False, action='store_true', help="write json without indentation")
+	ap.add_argument("--dedupe-formats", required=False, action='store_true', help="move the cell formats into a document-level format table even if the input has none")
+	args = vars(ap.parse_args())
+
+	# there is no configuration to take the log level from
+	logger.LOG_LEVEL = 2
+
+	start_time = time.time()
+	convert_document(input_path=args["input"], output_path=args["output"], compact=args["compact"], dedupe_formats=args["dedupe_formats"])
+	info(f"[{args['input']}] converted to [{args['output']}] in {time.time() - start_time:.2f} seconds")
@@ -2,6 +2,8 @@
 '''
 '''
 
+import threading
+
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 
@@ -33,17 +35,24 @@ class GoogleServices:
         # Load credentials from the service account JSON
         self._credential = service_account.Credentials.from_service_account_file(json_path, scopes=self.scopes)
 
-        # Build and cache the services
-        self._sheet_service = build('sheets', 'v4', credentials=self._credential)
-        self._drive_service = build('drive', 'v3', credentials=self._credential)
-        
+        # Build and cache the services, googleapiclient services (httplib2) are not thread safe, so every thread gets its own
+        self._thread_local = threading.local()
+        self._thread_local.sheet_service = build('sheets', 'v4', credentials=self._credential)
+        self._thread_local.drive_service = build('drive', 'v3', credentials=self._credential)
+
         debug(f"authorized  with Google", nesting_level=0)
         self._initialized = True
 
     @property
     def sheets_api(self):
-        return self._sheet_service
+        if not hasattr(self._thread_local, 'sheet_service'):
+            self._thread_local.sheet_service = build('sheets', 'v4', credentials=self._credential)
+
+        return self._thread_local.sheet_service
 
     @property
     def drive_api(self):
-        return self._drive_service
+        if not hasattr(self._thread_local, 'drive_service'):
+            self._thread_local.drive_service = build('drive', 'v3', credentials=self._credential)
+
+        return self._thread_local.drive_service
\ No newline at end of file
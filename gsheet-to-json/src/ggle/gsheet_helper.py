@@ -3,15 +3,32 @@
 '''
 
 import sys
-import pygsheets
+import json
 import importlib
+import threading
 from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 
 from ggle.google_services import GoogleServices
 from helper.config_service import ConfigService
+from helper.gsheet_id_cache import GsheetIdCache
 from helper.logger import *
+from helper import logger
+from helper.request_executor import RequestExecutor
+from helper.section_cache import SectionCache
+from helper.asset_store import AssetStore
 from helper.util import *
 
+''' a gsheet opened by the helper - what the processors need to know about it
+'''
+class Gsheet(object):
+
+    def __init__(self, id, title):
+        self.id = id
+        self.title = title
+
+
+
 class GsheetHelper(object):
 
     _instance = None
@@ -34,120 +51,109 @@ class GsheetHelper(object):
         self.google_services = GoogleServices()
         self.config_service = ConfigService()
 
-        self.google_services.pygsheet = pygsheets.authorize(custom_credentials=self.google_services._credential)
         self.worksheet_cache = {}
         self.gsheet_data = {}
+        self.worksheet_hashes = {}
         self.current_document_index = -1
 
+        # nested gsheets already read in this document tree, keyed by gsheet id and then by the parent context they were read in
+        self.processed_gsheets = {}
+
+        # nested gsheets are fetched in the background as soon as their parent's index worksheet is known
+        self.prefetched_gsheets = {}
+        self.prefetch_lock = threading.Lock()
+        self.prefetch_pool = None
+        if self.config_service._gsheet_fetch_thread_count > 1:
+            self.prefetch_pool = ThreadPoolExecutor(max_workers=self.config_service._gsheet_fetch_thread_count, thread_name_prefix='gsheet-prefetch')
+
         self._initialized = True
 
 
     ''' read the gsheet
+        section_writer: if given, the specs and then every processed section are written out through it instead of being returned
     '''
-    def read_gsheet(self, gsheet_title, gsheet_url=None, parent=None, nesting_level=0):
+    def read_gsheet(self, gsheet_title, gsheet_url=None, parent=None, section_writer=None, nesting_level=0):
         gsheet = None
-        for i in range(0, self.config_service._gsheet_read_try_count):
-            try:
-                if gsheet_url:
-                    gsheet_id = gsheet_id_from_url(url=gsheet_url, nesting_level=nesting_level)
-                    debug(f"opening gsheet id = {gsheet_id}", nesting_level=nesting_level)
-                    # TODO: get rid of pygsheet
-                    gsheet = self.google_services.pygsheet.open_by_url(gsheet_url)
-                    debug(f"opened  gsheet id = {gsheet_id}", nesting_level=nesting_level)
-                else:
-                    query = f'name = "{gsheet_title}"'
-                    
-                    debug(f"opening gsheet : [{gsheet_title}]", nesting_level=nesting_level)
-                    # TODO: get rid of pygsheet
-                    gsheets = self.google_services.pygsheet.open_all(query=query)
-                    for gsheet in gsheets:
-                        # Call the API to get permissions
-                        results = self.google_services.drive_api.permissions().list(fileId=gsheet.id, fields="permissions(id, emailAddress, role, displayName)").execute()
-                        trace(f"[{gsheet_title}] found with id [{gsheet.id}]", nesting_level=nesting_level)
-                        permissions = results.get('permissions', [])
-                        for perm in permissions:
-                            trace(f"{perm['role'].upper()}: {perm.get('displayName')} ({perm.get('emailAddress')})", nesting_level=nesting_level+1)
-
-                    if len(gsheets) > 1:
-                        error(f"[{len(gsheets)}] gsheets found with the name [{gsheet_title}] .. quiting", nesting_level=nesting_level)
-                        sys.exit(1)
-
-                    elif len(gsheets) == 1:
-                        gsheet = gsheets[0]
-                        
-                    else:
-                        error(f"no gsheet found with the name [{gsheet_title}] .. quiting", nesting_level=nesting_level)
-                        sys.exit(1)
-
-                    gsheet_id = gsheet.id
-                    debug(f"opened  gsheet : [{gsheet_title}] [{gsheet_id}]", nesting_level=nesting_level)
+        # every google api request is retried on its own by the RequestExecutor, a failure here is final
+        try:
+            if gsheet_url:
+                gsheet_id = gsheet_id_from_url(url=gsheet_url, nesting_level=nesting_level)
+                debug(f"opening gsheet id = {gsheet_id}", nesting_level=nesting_level)
 
-                # optimization - read the full gsheet
+                # optimization - read the full gsheet, it may already have been prefetched
                 debug(f"reading gsheet : [{gsheet_title}] [{gsheet_id}]", nesting_level=nesting_level)
-                response = get_gsheet_data(sheets_service=self.google_services.sheets_api, spreadsheet_id=gsheet.id, nesting_level=nesting_level+1)
-
-                # make a dictionary key'ed by worksheet_name
-                response = {sheet['properties']['title']: sheet for sheet in response['sheets']}
-
-
-                # parse and process the specs - pages, margins, fonts, style
-                specs_data = {'specs': {}}
-                for ws_name, spec_def in SPEC_DICT.items():
-                    # trace(f"check for [{ws_name}] worksheet", nesting_level=nesting_level+1)
-                    mandatory = spec_def.get('mandatory', False)
-                    if ws_name in response:
-                        trace(f"worksheet [{ws_name}] found", nesting_level=nesting_level+1)
-                        header_row_start = spec_def.get('header-row-start', 1)
-                        header_row_end = spec_def.get('header-row-end', 1)
-                        start_col = spec_def.get('start-col', 'A')
-                        end_col = spec_def.get('end-col', 'AZ')
-                        print_it = spec_def.get('print', False)
-                        spec_name = spec_def.get('spec-name')
-                        range_spec = f"'{ws_name}'!{start_col}1:{end_col}"
-                        # print(range_spec)
-
-                        # get values from the worksheet 
-                        values = get_range_values(sheets_service=self.google_services.sheets_api, spreadsheet_id=gsheet.id, range=range_spec, nesting_level=nesting_level+1)
-
-                        # parse the spec from the data
-                        spec_data = data_to_hierarchical_dict(data=values, header_row_start=header_row_start, header_row_end=header_row_end, key_column_name='key', nesting_level=nesting_level+1)
-                        if print_it:
-                            print_yml(spec_data)
-
-                        active_spec_data = {}
-                        # attach the data to the output json under 'specs' key and corresponding spec-name. 
-                        if spec_data:
-                            for spec_item_key, spec_item_value in spec_data.items():
-                                if 'active' in spec_item_value:
-                                    if spec_item_value['active'] != 'No':
-                                        active_spec_data[spec_item_key] = spec_item_value
-
-                                    else:
-                                        trace(f"style-spec [{spec_item_key}] is inactive, so ignoring the spec", nesting_level=nesting_level+1)
-
-                                # by default it is 'all'
-                                else:
-                                    spec_item_value['active'] = 'all'
+                response = self.fetch_gsheet_data(gsheet_id=gsheet_id, nesting_level=nesting_level+1)
+
+            else:
+                gsheet_id, response = self.open_gsheet_by_title(gsheet_title=gsheet_title, nesting_level=nesting_level)
+
+            gsheet = Gsheet(id=gsheet_id, title=response['properties']['title'])
+            debug(f"opened  gsheet : [{gsheet.title}] [{gsheet_id}]", nesting_level=nesting_level)
+
+            # make a dictionary key'ed by worksheet_name
+            response = {sheet['properties']['title']: sheet for sheet in response['sheets']}
+
+            # start fetching the nested gsheets in the background
+            self.prefetch_nested_gsheets(response=response, nesting_level=nesting_level+1)
+
+
+            # parse and process the specs - pages, margins, fonts, style
+            specs_data = {'specs': {}}
+            for ws_name, spec_def in SPEC_DICT.items():
+                # trace(f"check for [{ws_name}] worksheet", nesting_level=nesting_level+1)
+                mandatory = spec_def.get('mandatory', False)
+                if ws_name in response:
+                    trace(f"worksheet [{ws_name}] found", nesting_level=nesting_level+1)
+                    header_row_start = spec_def.get('header-row-start', 1)
+                    header_row_end = spec_def.get('header-row-end', 1)
+                    start_col = spec_def.get('start-col', 'A')
+                    end_col = spec_def.get('end-col', 'AZ')
+                    print_it = spec_def.get('print', False)
+                    spec_name = spec_def.get('spec-name')
+
+                    # get values from the worksheet, it is already there in the gsheet data
+                    values = worksheet_values(worksheet_data=response[ws_name], start_col=start_col, end_col=end_col, nesting_level=nesting_level+1)
+
+                    # parse the spec from the data
+                    spec_data = data_to_hierarchical_dict(data=values, header_row_start=header_row_start, header_row_end=header_row_end, key_column_name='key', nesting_level=nesting_level+1)
+                    if print_it:
+                        print_yml(spec_data)
+
+                    active_spec_data = {}
+                    # attach the data to the output json under 'specs' key and corresponding spec-name. 
+                    if spec_data:
+                        for spec_item_key, spec_item_value in spec_data.items():
+                            if 'active' in spec_item_value:
+                                if spec_item_value['active'] != 'No':
                                     active_spec_data[spec_item_key] = spec_item_value
 
-                            specs_data['specs'][spec_name] = active_spec_data
+                                else:
+                                    trace(f"style-spec [{spec_item_key}] is inactive, so ignoring the spec", nesting_level=nesting_level+1)
+
+                            # by default it is 'all'
+                            else:
+                                spec_item_value['active'] = 'all'
+                                active_spec_data[spec_item_key] = spec_item_value
 
+                        specs_data['specs'][spec_name] = active_spec_data
+
+                else:
+                    if mandatory:
+                        warn(f"mandatory worksheet [{ws_name}] missing", nesting_level=nesting_level+1)
                     else:
-                        if mandatory:
-                            warn(f"mandatory worksheet [{ws_name}] missing", nesting_level=nesting_level+1)
-                        else:
-                            trace(f"optional worksheet [{ws_name}] missing", nesting_level=nesting_level+1)
+                        trace(f"optional worksheet [{ws_name}] missing", nesting_level=nesting_level+1)
 
-                self.gsheet_data[gsheet_title] = response
+            self.gsheet_data[gsheet.title] = response
 
-                debug(f"read    gsheet : [{gsheet_title}] [{gsheet_id}]", nesting_level=nesting_level)
+            # in incremental mode the worksheets are hashed before any processing touches them
+            if self.config_service._incremental:
+                self.worksheet_hashes[gsheet.title] = {ws_title: worksheet_content_hash(worksheet_data) for ws_title, worksheet_data in response.items()}
 
-                break
+            debug(f"read    gsheet : [{gsheet_title}] [{gsheet_id}]", nesting_level=nesting_level)
 
-            except Exception as err:
-                print(err)
-                warn(f"gsheet {gsheet_title} read request (attempt {i}) failed, waiting for {self.config_service._gsheet_read_wait_seconds} seconds before trying again", nesting_level=nesting_level)
-                time.sleep(float(self.config_service._gsheet_read_wait_seconds))
+        except Exception as err:
+            error(f"gsheet [{gsheet_title}] could not be read: {err}", nesting_level=nesting_level)
+            gsheet = None
 
         if gsheet is None:
             error('gsheet read request failed, quiting', nesting_level=nesting_level)
@@ -186,16 +192,311 @@ class GsheetHelper(object):
 
 
         # read and process the gsheet
+        if section_writer:
+            section_writer.begin(specs_data)
+
         self.current_document_index = self.current_document_index + 1
-        data = self.process_gsheet(gsheet=gsheet, parent=parent, current_document_index=self.current_document_index, nesting_level=nesting_level+1)
+        data = self.process_gsheet(gsheet=gsheet, parent=parent, current_document_index=self.current_document_index, section_writer=section_writer, nesting_level=nesting_level+1)
+
+        if section_writer:
+            section_writer.end()
 
         return {**specs_data, **data}
 
 
+    ''' read a nested gsheet linked from a parent section
+        a gsheet that was already read in this document tree in the same parent context is not read again, its processed tree is reused with the document indices renumbered as if it had been read here
+    '''
+    def read_nested_gsheet(self, gsheet_title, gsheet_url, parent, nesting_level=0):
+        gsheet_id = gsheet_id_from_url(url=gsheet_url, nesting_level=nesting_level)
+        context_key = self.parent_context_key(parent=parent)
+
+        processed = self.processed_gsheets.get(gsheet_id, {}).get(context_key)
+        if processed is not None:
+            data, first_document_index, document_count = processed
+            debug(f"gsheet [{gsheet_title}] [{gsheet_id}] already read, reusing its [{document_count}] documents", nesting_level=nesting_level)
+            data = self.renumber_documents(data=deepcopy(data), offset=self.current_document_index + 1 - first_document_index)
+            self.current_document_index = self.current_document_index + document_count
+            return data
+
+        first_document_index = self.current_document_index + 1
+        data = self.read_gsheet(gsheet_title=gsheet_title, gsheet_url=gsheet_url, parent=parent, nesting_level=nesting_level)
+        self.processed_gsheets.setdefault(gsheet_id, {})[context_key] = (data, first_document_index, self.current_document_index + 1 - first_document_index)
+
+        return data
+
+
+    ''' what the output of a nested gsheet depends on from its parent section - the nesting depth, the page and margin spec and the overridden headers/footers
+    '''
+    def parent_context_key(self, parent):
+        parent_context = {
+            'document-nesting-depth': parent['section-prop']['level'] + parent['section-meta']['document-nesting-depth'] + 1,
+            'page-spec': parent['section-prop']['page-spec'],
+            'margin-spec': parent['section-prop']['margin-spec'],
+            'header-footer': self.parent_header_footer(parent=parent),
+        }
+
+        return json.dumps(parent_context, sort_keys=True, default=str)
+
+
+    ''' shift the document indices of a processed gsheet tree (the gsheet itself and its nested gsheets) by an offset
+    '''
+    def renumber_documents(self, data, offset):
+        for section in data['sections']:
+            section['section-meta']['document-index'] = section['section-meta']['document-index'] + offset
+            if section['section-prop']['content-type'] == 'gsheet' and isinstance(section.get('contents'), dict):
+                self.renumber_documents(data=section['contents'], offset=offset)
+
+        return data
+
+
+    ''' drop everything held for the documents read so far - the gsheet data, worksheets and their hashes of the whole document tree
+        called once a top-level document is written, the next top-level document is numbered from 0 again
+        returns the number of documents (the top-level one and its nested gsheets) that were read
+    '''
+    def release_documents(self, nesting_level=0):
+        document_count = self.current_document_index + 1
+        trace(f"releasing [{len(self.gsheet_data)}] gsheets of [{document_count}] documents", nesting_level=nesting_level)
+
+        self.worksheet_cache.clear()
+        self.gsheet_data.clear()
+        self.worksheet_hashes.clear()
+        self.processed_gsheets.clear()
+        with self.prefetch_lock:
+            for future in self.prefetched_gsheets.values():
+                future.cancel()
+
+            self.prefetched_gsheets.clear()
+
+        self.current_document_index = -1
+        importlib.import_module('processor.table_processor').release_downloads()
+
+        return document_count
+
+
+    ''' find a gsheet by its title and read it, returns the gsheet id and the gsheet data
+        the id is taken from the gsheet id cache when it is known, a cached id that can not be opened, is in the trash or opens a gsheet with another title is dropped and the title is searched in drive
+    '''
+    def open_gsheet_by_title(self, gsheet_title, nesting_level=0):
+        debug(f"opening gsheet : [{gsheet_title}]", nesting_level=nesting_level)
+        if self.config_service._gsheet_id_cache:
+            gsheet_id = GsheetIdCache().get(gsheet_title)
+            if gsheet_id:
+                debug(f"reading gsheet : [{gsheet_title}] [{gsheet_id}] (cached id)", nesting_level=nesting_level)
+                try:
+                    # a trashed gsheet can still be opened by its id, but the drive search never finds it
+                    drive_file = RequestExecutor().execute(self.google_services.drive_api.files().get(fileId=gsheet_id, fields='name,trashed'), nesting_level=nesting_level+1)
+                    if drive_file.get('trashed'):
+                        trace(f"gsheet [{gsheet_id}] is in the trash", nesting_level=nesting_level)
+
+                    elif drive_file.get('name') != gsheet_title:
+                        trace(f"gsheet [{gsheet_id}] is now titled [{drive_file.get('name')}]", nesting_level=nesting_level)
+
+                    else:
+                        response = self.fetch_gsheet_data(gsheet_id=gsheet_id, nesting_level=nesting_level+1)
+                        if response['properties']['title'] == gsheet_title:
+                            return gsheet_id, response
+
+                        trace(f"gsheet [{gsheet_id}] is now titled [{response['properties']['title']}]", nesting_level=nesting_level)
+
+                except Exception as e:
+                    trace(f"gsheet [{gsheet_title}] could not be opened with the cached id [{gsheet_id}]: {e}", nesting_level=nesting_level)
+
+                GsheetIdCache().invalidate(gsheet_title=gsheet_title, nesting_level=nesting_level)
+
+        gsheet_id = self.find_gsheet_id(gsheet_title=gsheet_title, nesting_level=nesting_level)
+
+        # optimization - read the full gsheet
+        debug(f"reading gsheet : [{gsheet_title}] [{gsheet_id}]", nesting_level=nesting_level)
+        response = self.fetch_gsheet_data(gsheet_id=gsheet_id, nesting_level=nesting_level+1)
+        if self.config_service._gsheet_id_cache:
+            GsheetIdCache().put(gsheet_title=gsheet_title, gsheet_id=gsheet_id, nesting_level=nesting_level)
+
+        return gsheet_id, response
+
+
+    ''' search drive for the gsheet with the given title, there must be exactly one
+    '''
+    def find_gsheet_id(self, gsheet_title, nesting_level=0):
+        drive_files = find_gsheets_by_name(drive_service=self.google_services.drive_api, gsheet_title=gsheet_title, nesting_level=nesting_level+1)
+        for drive_file in drive_files:
+            trace(f"[{gsheet_title}] found with id [{drive_file['id']}]", nesting_level=nesting_level)
+
+        # who has access is only listed on demand, it costs a drive api call per file
+        if self.config_service._audit_permissions and logger.LOG_LEVEL < 1:
+            self.audit_permissions(drive_files=drive_files, nesting_level=nesting_level+1)
+
+        if len(drive_files) > 1:
+            error(f"[{len(drive_files)}] gsheets found with the name [{gsheet_title}] .. quiting", nesting_level=nesting_level)
+            sys.exit(1)
+
+        elif len(drive_files) == 0:
+            error(f"no gsheet found with the name [{gsheet_title}] .. quiting", nesting_level=nesting_level)
+            sys.exit(1)
+
+        return drive_files[0]['id']
+
+
+    ''' trace who has access to the given drive files
+    '''
+    def audit_permissions(self, drive_files, nesting_level=0):
+        for drive_file in drive_files:
+            results = RequestExecutor().execute(self.google_services.drive_api.permissions().list(fileId=drive_file['id'], fields="permissions(id, emailAddress, role, displayName)"), nesting_level=nesting_level)
+            trace(f"[{drive_file['id']}] permissions", nesting_level=nesting_level)
+            for perm in results.get('permissions', []):
+                trace(f"{perm['role'].upper()}: {perm.get('displayName')} ({perm.get('emailAddress')})", nesting_level=nesting_level+1)
+
+
+    ''' get the full gsheet data, from the prefetched ones if it was prefetched
+    '''
+    def fetch_gsheet_data(self, gsheet_id, nesting_level=0):
+        with self.prefetch_lock:
+            future = self.prefetched_gsheets.pop(gsheet_id, None)
+
+        if future:
+            trace(f"gsheet [{gsheet_id}] was prefetched", nesting_level=nesting_level)
+            return future.result()
+
+        return self.get_gsheet_data(gsheet_id=gsheet_id, nesting_level=nesting_level)
+
+
+    ''' get the gsheet data from the api or from the on-disk gsheet cache
+        the cached data is a planned subset of the gsheet, it is reused only if it was planned with the same index worksheets, spec worksheets and fields
+    '''
+    def get_gsheet_data(self, gsheet_id, nesting_level=0):
+        fetch_data = lambda: self.fetch_planned_gsheet_data(gsheet_id=gsheet_id, nesting_level=nesting_level)
+        if self.config_service._gsheet_cache:
+            plan = {'index-worksheet': self.config_service._index_worksheet, 'spec-worksheets': sorted(SPEC_DICT.keys()), 'fields': GSHEET_GRID_FIELDS}
+            return get_gsheet_data_cached(drive_service=self.google_services.drive_api, spreadsheet_id=gsheet_id, cache_dir=self.config_service._gsheet_cache_dir, fetch_data=fetch_data, plan=plan, nesting_level=nesting_level)
+
+        return fetch_data()
+
+
+    ''' fetch only the worksheets of a gsheet that are going to be processed and only the fields that are consumed down the line
+        the index worksheet is read first to plan the fetch - the linked worksheets, headers/footers, specs and whatever worksheets those link to
+    '''
+    def fetch_planned_gsheet_data(self, gsheet_id, nesting_level=0):
+        sheets_service = self.google_services.sheets_api
+        metadata = get_gsheet_data(sheets_service=sheets_service, spreadsheet_id=gsheet_id, include_grid_data=False, fields=GSHEET_METADATA_FIELDS, nesting_level=nesting_level)
+        worksheet_titles = [sheet['properties']['title'] for sheet in metadata.get('sheets', [])]
+
+        fetched = {}
+        planned = set(ws_title for ws_title in SPEC_DICT.keys() if ws_title in worksheet_titles)
+
+        # the index worksheet tells which worksheets are going to be needed
+        index_ws_title = self.index_worksheet_title(worksheet_titles=worksheet_titles)
+        if index_ws_title:
+            response = get_gsheet_data(sheets_service=sheets_service, spreadsheet_id=gsheet_id, ranges=[worksheet_range(index_ws_title)], fields=GSHEET_GRID_FIELDS, nesting_level=nesting_level)
+            fetched[index_ws_title] = response['sheets'][0]
+            planned.update(self.worksheets_linked_from_toc(index_worksheet_data=fetched[index_ws_title]))
+
+        # fetch the planned worksheets, then whatever worksheets they link to, until nothing new is found
+        ws_titles_to_fetch = [ws_title for ws_title in worksheet_titles if ws_title in planned and ws_title not in fetched]
+        while ws_titles_to_fetch:
+            response = get_gsheet_data(sheets_service=sheets_service, spreadsheet_id=gsheet_id, ranges=[worksheet_range(ws_title) for ws_title in ws_titles_to_fetch], fields=GSHEET_GRID_FIELDS, nesting_level=nesting_level)
+            linked = set()
+            for sheet in response.get('sheets', []):
+                fetched[sheet['properties']['title']] = sheet
+                linked.update(worksheets_linked_from_formulas(worksheet_data=sheet))
+
+            ws_titles_to_fetch = [ws_title for ws_title in worksheet_titles if ws_title in linked and ws_title not in fetched]
+
+        trace(f"[{len(fetched)}] of [{len(worksheet_titles)}] worksheets fetched", nesting_level=nesting_level)
+
+        return {'spreadsheetId': metadata['spreadsheetId'], 'properties': metadata['properties'], 'sheets': [fetched[ws_title] for ws_title in worksheet_titles if ws_title in fetched]}
+
+
+    ''' titles of the worksheets the processed rows of an index worksheet link to - table content and header/footer worksheets
+    '''
+    def worksheets_linked_from_toc(self, index_worksheet_data):
+        ws_titles = set()
+
+        # we expect toc data to start from row 2, the first row of the toc data is the header
+        toc_list = worksheet_formula_matrix(worksheet_data=index_worksheet_data, start_row=1)
+        if len(toc_list) == 0 or 'process' not in toc_list[0]:
+            return ws_titles
+
+        header_list = toc_list[0]
+        process_column = header_list.index('process')
+        for toc in toc_list[1:]:
+            if toc[process_column] != 'Yes':
+                continue
+
+            for header in ['link', 'header-first', 'header-odd', 'header-even', 'footer-first', 'footer-odd', 'footer-even']:
+                if header in header_list and toc[header_list.index(header)] != '':
+                    ws_titles.add(get_worksheet_link(str(toc[header_list.index(header)])))
+
+        return ws_titles
+
+
+    ''' find the gsheet links in the index worksheet of a gsheet and start fetching them in the background
+        response: the gsheet data as a dictionary keyed by worksheet name
+    '''
+    def prefetch_nested_gsheets(self, response, nesting_level=0):
+        if self.prefetch_pool is None:
+            return
+
+        ws_title = self.index_worksheet_title(worksheet_titles=response.keys())
+        if ws_title is None:
+            return
+
+        # we expect toc data to start from row 2, the first row of the toc data is the header
+        toc_list = worksheet_formula_matrix(worksheet_data=response[ws_title], start_row=1)
+        if len(toc_list) == 0:
+            return
+
+        header_list = toc_list[0]
+        if not all(header in header_list for header in ['process', 'content-type', 'link']):
+            return
+
+        process_column = header_list.index('process')
+        content_type_column = header_list.index('content-type')
+        link_column = header_list.index('link')
+
+        for toc in toc_list[1:]:
+            if toc[process_column] != 'Yes' or toc[content_type_column] != 'gsheet':
+                continue
+
+            _, gsheet_url = get_gsheet_link(str(toc[link_column]), nesting_level=nesting_level)
+            if not gsheet_url or not gsheet_url.startswith('https://docs.google.com/spreadsheets/'):
+                continue
+
+            gsheet_id = gsheet_id_from_url(url=gsheet_url, nesting_level=nesting_level)
+            with self.prefetch_lock:
+                if gsheet_id in self.prefetched_gsheets or gsheet_id in self.processed_gsheets:
+                    continue
+
+                trace(f"prefetching gsheet id = [{gsheet_id}]", nesting_level=nesting_level)
+                self.prefetched_gsheets[gsheet_id] = self.prefetch_pool.submit(self.prefetch_gsheet, gsheet_id=gsheet_id, nesting_level=nesting_level)
+
+
+    ''' fetch a gsheet in a prefetch worker thread and then start fetching its own nested gsheets
+    '''
+    def prefetch_gsheet(self, gsheet_id, nesting_level=0):
+        response = self.get_gsheet_data(gsheet_id=gsheet_id, nesting_level=nesting_level)
+        self.prefetch_nested_gsheets(response={sheet['properties']['title']: sheet for sheet in response['sheets']}, nesting_level=nesting_level)
+
+        return response
+
+
+    ''' the first worksheet from the configured index worksheet list that is present in the given worksheet titles
+    '''
+    def index_worksheet_title(self, worksheet_titles):
+        index_worksheet = self.config_service._index_worksheet
+        if not isinstance(index_worksheet, list):
+            index_worksheet = [index_worksheet]
+
+        for ws_title in index_worksheet:
+            if ws_title in worksheet_titles:
+                return ws_title
+
+        return None
+
+
     ''' process gsheet from the toc
         worksheet_cache: nested dictionary of gsheet->worksheet as two different sheets may have worksheets of same name, so keying by only worksheet name is not feasible
     '''
-    def process_gsheet(self, gsheet, parent, current_document_index, nesting_level=0):
+    def process_gsheet(self, gsheet, parent, current_document_index, section_writer=None, nesting_level=0):
         data = {'sections': []}
 
         # worksheet_cache: nested dictionary of gsheet->worksheet as two different sheets may have worksheets of same name, so keying by only worksheet name is not feasible
@@ -205,36 +506,15 @@ class GsheetHelper(object):
 
         # locate the index worksheet, it is a list, we take the first available from the list
         # it can also be a single worksheet for backword compatibility
-        index_ws = None
-        if isinstance(ConfigService()._index_worksheet, list):
-            for ws_title in ConfigService()._index_worksheet:
-                try:
-                    index_ws = gsheet.worksheet('title', ws_title)
-                    if index_ws:
-                        break
-
-                except Exception as e:
-                    warn(f"index worksheet [{ws_title}] not found", nesting_level=nesting_level)
-                    pass
-
-            if index_ws is None:
-                error(f"index worksheet not found from the list [{ConfigService()._index_worksheet}]")
-                return
-
-        else:
-            ws_title = ConfigService()._index_worksheet
-            try:
-                index_ws = gsheet.worksheet('title', ws_title)
-            except Exception as e:
-                error(f"index worksheet [{ws_title}] not found")
-                return
+        ws_title = self.index_worksheet_title(worksheet_titles=self.gsheet_data[gsheet.title].keys())
+        if ws_title is None:
+            error(f"index worksheet not found from the list [{ConfigService()._index_worksheet}]")
+            return
 
-        if index_ws:
-            debug(f"index worksheet [{ws_title}] found", nesting_level=nesting_level)
+        debug(f"index worksheet [{ws_title}] found", nesting_level=nesting_level)
 
         # we expect toc data to start from row 2
-        last_column = COLUMNS[index_ws.cols-1]
-        toc_list = index_ws.get_values(start='A2', end=f"{last_column}{index_ws.rows}", returnas='matrix', majdim='ROWS', include_tailing_empty=True, include_tailing_empty_rows=False, value_render='FORMULA')
+        toc_list = worksheet_formula_matrix(worksheet_data=self.gsheet_data[gsheet.title][ws_title], start_row=1)
 
         # make a deep copy of MASTER_TOC_COLUMNS for this gsheet
         TOC_COLUMNS = deepcopy(MASTER_TOC_COLUMNS)
@@ -294,7 +574,14 @@ class GsheetHelper(object):
 
         section_index = 0
         for section_index, toc in enumerate(toc_list_to_process):
-            data['sections'].append(self.process_section(gsheet=gsheet, toc=toc, current_document_index=current_document_index, section_index=section_index, parent=parent, TOC_COLUMNS=TOC_COLUMNS, nesting_level=nesting_level))
+            section = self.process_section(gsheet=gsheet, toc=toc, current_document_index=current_document_index, section_index=section_index, parent=parent, TOC_COLUMNS=TOC_COLUMNS, nesting_level=nesting_level)
+
+            # a streamed section is written out right away and not kept
+            if section_writer:
+                section_writer.write_section(section)
+
+            else:
+                data['sections'].append(section)
 
         return data
 
@@ -367,6 +654,8 @@ class GsheetHelper(object):
 
                 'jpeg-quality'          : translate_dict_to_value(data_list=toc, dict_obj=TOC_COLUMNS, first_key='jpeg-quality', nesting_level=nesting_level+1),
                 'page-list'             : translate_dict_to_value(data_list=toc, dict_obj=TOC_COLUMNS, first_key='page-list', nesting_level=nesting_level+1),
+                'dpi'                   : translate_dict_to_value(data_list=toc, dict_obj=TOC_COLUMNS, first_key='dpi', nesting_level=nesting_level+1),
+                'page-format'           : translate_dict_to_value(data_list=toc, dict_obj=TOC_COLUMNS, first_key='page-format', nesting_level=nesting_level+1),
                 'autocrop'              : translate_dict_to_value(data_list=toc, dict_obj=TOC_COLUMNS, first_key='autocrop', look_up_value='Yes', nesting_level=nesting_level+1),
                 'page-bg'               : translate_dict_to_value(data_list=toc, dict_obj=TOC_COLUMNS, first_key='page-bg', look_up_value='Yes', nesting_level=nesting_level+1),
 
@@ -409,6 +698,46 @@ class GsheetHelper(object):
 
         section_meta['page-layout'] = f"{section_prop['page-spec']}-{section_meta['orientation']}-{section_prop['margin-spec']}"
 
+        # in incremental mode an unchanged section is taken as it was emitted in the last run, only the section-meta is computed afresh
+        # nested gsheets are never taken as a whole, their own sections are
+        fingerprint = None
+        if self.config_service._incremental and section_prop['content-type'] != 'gsheet':
+            fingerprint = self.section_fingerprint(gsheet=gsheet, d=d, parent=parent)
+            cached_section = SectionCache().load(fingerprint=fingerprint, nesting_level=nesting_level)
+            if cached_section is not None:
+                debug(f"section [{worksheet_name}] unchanged since the last run, reusing it", nesting_level=nesting_level)
+                section_meta['different-firstpage'] = cached_section.pop('different-firstpage')
+                section_meta['different-odd-even-pages'] = cached_section.pop('different-odd-even-pages')
+                d.update(cached_section)
+                return d
+
+            # the assets the section is made from are collected while it is processed, they are revalidated when the cached section is loaded
+            AssetStore().start_collecting()
+            try:
+                self.process_section_content(gsheet=gsheet, d=d, parent=parent, current_document_index=current_document_index, nesting_level=nesting_level)
+
+            finally:
+                assets = AssetStore().stop_collecting()
+
+            section = {key: d[key] for key in SECTION_HEADER_FOOTER_KEYS}
+            section['contents'] = d['contents']
+            section['different-firstpage'] = section_meta['different-firstpage']
+            section['different-odd-even-pages'] = section_meta['different-odd-even-pages']
+            SectionCache().save(fingerprint=fingerprint, section=section, assets=assets, nesting_level=nesting_level)
+
+            return d
+
+        self.process_section_content(gsheet=gsheet, d=d, parent=parent, current_document_index=current_document_index, nesting_level=nesting_level)
+
+        return d
+
+
+    ''' process the headers/footers and the contents of a section into the section dict d
+    '''
+    def process_section_content(self, gsheet, d, parent, current_document_index, nesting_level):
+        section_meta = d['section-meta']
+        section_prop = d['section-prop']
+
         different_header_first_page = False
         different_footer_first_page = False
 
@@ -555,4 +884,67 @@ class GsheetHelper(object):
             module = importlib.import_module(f"processor.{section_prop['content-type']}_processor")
             d['contents'] = module.process(gsheet=gsheet, section_data=d, worksheet_cache=self.worksheet_cache, gsheet_data=self.gsheet_data, current_document_index=current_document_index, nesting_level=nesting_level)
 
-        return d
+
+    ''' the fingerprint of a section from its properties, its header/footer links (or the parent's overriding headers/footers) and the worksheets it reads
+    '''
+    def section_fingerprint(self, gsheet, d, parent):
+        header_footer = {key: d[key] for key in SECTION_HEADER_FOOTER_KEYS}
+        parent_header_footer = self.parent_header_footer(parent=parent)
+
+        ws_titles = [ws_title for ws_title in header_footer.values() if ws_title]
+        if d['section-prop']['content-type'] == 'table':
+            ws_titles.append(d['section-prop']['link'])
+
+        worksheet_hashes = self.linked_worksheet_hashes(gsheet=gsheet, ws_titles=ws_titles)
+        render_settings = self.section_render_settings(section_prop=d['section-prop'])
+
+        return SectionCache().fingerprint(gsheet_id=gsheet.id, section_prop=d['section-prop'], render_settings=render_settings, header_footer=header_footer, parent_header_footer=parent_header_footer, worksheet_hashes=worksheet_hashes)
+
+
+    ''' the settings a section's output depends on that are not in its properties as they are, but resolved from them and the configuration
+        for pdf sections that is the dpi, page format and jpeg quality the pages are rendered with, and the autocrop tolerance if the pages/image are autocropped
+    '''
+    def section_render_settings(self, section_prop):
+        render_settings = {}
+        if section_prop['content-type'] == 'pdf':
+            render_settings.update(importlib.import_module('processor.pdf_processor').section_render_settings(section_prop=section_prop))
+            if section_prop['autocrop']:
+                render_settings['autocrop-tolerance'] = self.config_service._autocrop_tolerance
+
+        return render_settings
+
+
+    ''' the headers/footers a parent section imposes on the sections of its nested gsheet through its override flags
+    '''
+    def parent_header_footer(self, parent):
+        parent_header_footer = {}
+        if parent:
+            if parent['section-prop']['override-header']:
+                parent_header_footer.update({key: parent[key] for key in ['header-first', 'header-odd', 'header-even']})
+                parent_header_footer['different-firstpage'] = parent['section-meta']['different-firstpage']
+
+            if parent['section-prop']['override-footer']:
+                parent_header_footer.update({key: parent[key] for key in ['footer-first', 'footer-odd', 'footer-even']})
+                parent_header_footer['different-firstpage'] = parent['section-meta']['different-firstpage']
+
+        return parent_header_footer
+
+
+    ''' the content hashes of the given worksheets and of every worksheet they link to through formulas
+    '''
+    def linked_worksheet_hashes(self, gsheet, ws_titles):
+        worksheets = self.gsheet_data[gsheet.title]
+        hashes = self.worksheet_hashes.get(gsheet.title, {})
+
+        linked_hashes = {}
+        ws_titles_to_check = list(ws_titles)
+        while ws_titles_to_check:
+            ws_title = ws_titles_to_check.pop()
+            if ws_title in linked_hashes:
+                continue
+
+            linked_hashes[ws_title] = hashes.get(ws_title)
+            if ws_title in worksheets:
+                ws_titles_to_check.extend(worksheets_linked_from_formulas(worksheet_data=worksheets[ws_title]))
+
+        return linked_hashes
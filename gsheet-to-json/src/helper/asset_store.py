@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+'''
+'''
+
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+from helper.config_service import ConfigService
+from helper.logger import *
+
+class AssetStore:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(AssetStore, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, nesting_level=0):
+        if self._initialized:
+            return
+
+        config_service = ConfigService()
+        self._store_dir = config_service._temp_dir / 'assets'
+        self._store_dir.mkdir(parents=True, exist_ok=True)
+        self._index_path = self._store_dir / 'index.json'
+        self._index_lock_path = self._store_dir / 'index.lock'
+        self._index_mtime = None
+        self._max_size = int(config_service._asset_store_max_size_mb) * 1024 * 1024
+
+        self._lock = threading.Lock()
+        self._index = self.load_index(nesting_level=nesting_level)
+
+        # last-used times of the assets used since the last flush, they are written to the index by flush_usage
+        self._usage = {}
+
+        # the collections of used assets open in a thread, see start_collecting
+        self._collecting = threading.local()
+
+        self._initialized = True
+
+
+    ''' the index is a dict keyed by asset key (drive:{file-id} or web:{url})
+        {'file': file name in the store, 'validator': {...}, 'size': bytes, 'last-used': epoch seconds}
+    '''
+    def load_index(self, nesting_level=0):
+        if not self._index_path.exists():
+            return {}
+
+        try:
+            self._index_mtime = self._index_path.stat().st_mtime_ns
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        except Exception as e:
+            warn(f"asset store index could not be read, starting with an empty index: {e}", nesting_level=nesting_level)
+            return {}
+
+
+    ''' write the index atomically, must be called holding the lock
+    '''
+    def save_index(self):
+        index_tmp_path = self._index_path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        with open(index_tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2)
+
+        os.replace(index_tmp_path, self._index_path)
+        self._index_mtime = self._index_path.stat().st_mtime_ns
+
+
+    ''' reload the index if another process (batch mode) has written it since it was last read or written here, must be called holding the lock
+    '''
+    def refresh_index(self, nesting_level=0):
+        if self._index_path.exists() and self._index_path.stat().st_mtime_ns != self._index_mtime:
+            self._index = self.load_index(nesting_level=nesting_level)
+
+
+    ''' an exclusive lock on the index across the processes sharing the store, the index is reloaded and changed only while holding it
+        where fcntl is not available (windows) only one process should use the store at a time
+    '''
+    @contextmanager
+    def index_file_lock(self):
+        try:
+            import fcntl
+
+        except ImportError:
+            yield
+            return
+
+        with open(self._index_lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+    ''' the index entry of an asset if the asset file is still there
+    '''
+    def entry(self, key):
+        with self._lock:
+            self.refresh_index()
+            entry = self._index.get(key)
+            if entry and (self._store_dir / entry['file']).exists():
+                return dict(entry)
+
+            return None
+
+
+    ''' local path of an asset if it is in the store with the same validator (checksum, modifiedTime, ETag ...)
+    '''
+    def get(self, key, validator):
+        entry = self.entry(key)
+        if entry and entry['validator'] == validator:
+            return self.touch(key)
+
+        return None
+
+
+    ''' mark an asset as used now and return its local path
+        the time is only recorded in memory, the index is not rewritten for every use
+    '''
+    def touch(self, key):
+        with self._lock:
+            self.refresh_index()
+            entry = self._index.get(key)
+            if entry is None or not (self._store_dir / entry['file']).exists():
+                return None
+
+            self._usage[key] = time.time()
+            self.record_assets({key: entry['validator']})
+
+            return str((self._store_dir / entry['file']).resolve())
+
+
+    ''' put an asset into the store, write_function(path) writes the content of the asset to the given path
+        the file name is derived from the key and the validator, so a changed asset never overwrites the old one while it is being written
+    '''
+    def put(self, key, validator, file_ext, write_function, nesting_level=0):
+        digest = hashlib.sha1(f"{key}|{json.dumps(validator, sort_keys=True)}".encode('utf-8')).hexdigest()[:24]
+        file_name = f"{digest}{file_ext or ''}"
+        local_path = self._store_dir / file_name
+        tmp_path = self._store_dir / f"{file_name}.{os.getpid()}-{threading.get_ident()}.part"
+
+        try:
+            write_function(tmp_path)
+            os.replace(tmp_path, local_path)
+
+        except Exception as e:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+            raise e
+
+        with self._lock, self.index_file_lock():
+            self.refresh_index(nesting_level=nesting_level)
+            old_entry = self._index.get(key)
+            if old_entry and old_entry['file'] != file_name and (self._store_dir / old_entry['file']).exists():
+                (self._store_dir / old_entry['file']).unlink()
+
+            self._index[key] = {'file': file_name, 'validator': validator, 'size': local_path.stat().st_size, 'last-used': time.time()}
+            self._usage.pop(key, None)
+            self.save_index()
+
+        self.record_assets({key: validator})
+
+        return str(local_path.resolve())
+
+
+    ''' start collecting the assets (key and validator) this thread uses, until the matching stop_collecting
+        collections nest, an asset used while several are open goes into each of them
+    '''
+    def start_collecting(self):
+        if not hasattr(self._collecting, 'stack'):
+            self._collecting.stack = []
+
+        self._collecting.stack.append({})
+
+
+    ''' stop the innermost collection of this thread and return the assets it collected as {key: validator}
+    '''
+    def stop_collecting(self):
+        return self._collecting.stack.pop()
+
+
+    ''' add assets ({key: validator}) to the collections open in this thread
+        downloads run in other threads, their assets are handed over with this when the downloads are resolved
+    '''
+    def record_assets(self, assets):
+        for collected in getattr(self._collecting, 'stack', []):
+            collected.update(assets)
+
+
+    ''' write the last-used times recorded since the last flush into the index
+    '''
+    def flush_usage(self, nesting_level=0):
+        with self._lock, self.index_file_lock():
+            if not self._usage:
+                return
+
+            self.refresh_index(nesting_level=nesting_level)
+            self.apply_usage()
+            self.save_index()
+
+
+    ''' move the recorded last-used times into the index, must be called holding the lock
+    '''
+    def apply_usage(self):
+        for key, last_used in self._usage.items():
+            if key in self._index:
+                self._index[key]['last-used'] = max(self._index[key]['last-used'], last_used)
+
+        self._usage.clear()
+
+
+    ''' evict the least recently used assets until the store is within its size cap
+        this is done once at the end of a run, the assets used since keep_since (the start of the run) are never evicted as the documents written in the run refer to them
+    '''
+    def evict(self, keep_since, nesting_level=0):
+        if self._max_size <= 0:
+            return
+
+        with self._lock, self.index_file_lock():
+            self.refresh_index(nesting_level=nesting_level)
+            self.apply_usage()
+
+            total_size = sum(entry['size'] for entry in self._index.values())
+            for key, entry in sorted(self._index.items(), key=lambda item: item[1]['last-used']):
+                if total_size <= self._max_size or entry['last-used'] >= keep_since:
+                    break
+
+                asset_path = self._store_dir / entry['file']
+                if asset_path.exists():
+                    asset_path.unlink()
+
+                total_size = total_size - entry['size']
+                del self._index[key]
+                trace(f"asset [{key}] evicted from the asset store", nesting_level=nesting_level)
+
+            self.save_index()
+
+            if total_size > self._max_size:
+                debug(f"asset store holds [{total_size // (1024 * 1024)}] MB, more than its cap, all of it is used by this run", nesting_level=nesting_level)
@@ -29,18 +29,46 @@ class ConfigService:
 
         self._log_level = _config_dict.get("log-level", 0)
         logger.LOG_LEVEL = self._log_level
+        self._import_time_budget_ms = _config_dict.get('import-time-budget-ms', 500)
 
         self._gsheet_list = _config_dict.get('gsheets', [])
         self._output_dir = Path(_config_dict.get('output-dir')).resolve()
         self._google_cred_json_path = Path(_config_dict.get('google-cred')).resolve()
         self._autocrop_pdf_pages = _config_dict.get('autocrop-pdf-pages', False)
+        self._pdf_page_cache = _config_dict.get('pdf-page-cache', True)
+        self._pdf_page_dpi = _config_dict.get('pdf-page-dpi', 72)
+        self._pdf_render_thread_count = _config_dict.get('pdf-render-thread-count', 0)
+        self._autocrop_tolerance = _config_dict.get('autocrop-tolerance', 16)
+        self._autocrop_thread_count = _config_dict.get('autocrop-thread-count', 0)
 
         self._temp_dir = self._output_dir / 'tmp'
         self._temp_dir.mkdir(parents=True, exist_ok=True)
 
+        self._http_pool_hosts = _config_dict.get('http-pool-hosts', 10)
+        self._http_pool_connections_per_host = _config_dict.get('http-pool-connections-per-host', 8)
+        self._http_timeout_seconds = _config_dict.get('http-timeout-seconds', 60)
+        self._http_chunk_size_kb = _config_dict.get('http-chunk-size-kb', 1024)
+
         self._index_worksheet = _config_dict.get('index-worksheet', '-toc')
+        self._audit_permissions = _config_dict.get('audit-permissions', False)
         self._gsheet_read_wait_seconds = _config_dict.get('gsheet-read-wait-seconds', 60)
         self._gsheet_read_try_count = _config_dict.get('gsheet-read-try-count', 3)
+        self._google_api_backoff_seconds = _config_dict.get('google-api-backoff-seconds', 2)
+        self._google_api_requests_per_minute = _config_dict.get('google-api-requests-per-minute', {'sheets': 60, 'drive': 600})
+        self._gsheet_fetch_thread_count = _config_dict.get('gsheet-fetch-thread-count', 8)
+        self._asset_download_thread_count = _config_dict.get('asset-download-thread-count', 8)
+        self._batch_process_count = _config_dict.get('batch-process-count', 1)
+        self._asset_store_max_size_mb = _config_dict.get('asset-store-max-size-mb', 10240)
+        self._gsheet_cache = _config_dict.get('gsheet-cache', True)
+        self._gsheet_cache_dir = self._temp_dir / 'gsheet-cache'
+        self._gsheet_id_cache = _config_dict.get('gsheet-id-cache', True)
+        self._incremental = _config_dict.get('incremental', False)
+        self._compact_json = _config_dict.get('compact-json', False)
+        self._interchange_format = _config_dict.get('interchange-format', 'json')
+        self._format_table = _config_dict.get('format-table', False)
+        self._section_cache_dir = self._temp_dir / 'sections'
+        self._pdf_page_cache_dir = self._temp_dir / 'pages'
+        self._autocrop_dir = self._temp_dir / 'autocrop'
 
         self._initialized = True
 
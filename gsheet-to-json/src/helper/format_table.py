@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+'''
+'''
+
+import json
+
+''' the document-level table of the distinct cell formats (effectiveFormat/userEnteredFormat)
+    the format dicts of the cells are replaced by their index in the table, most cells of a document share a handful of formats
+'''
+class FormatTable(object):
+
+    def __init__(self, formats=None):
+        self.formats = list(formats or [])
+        self.index = {self.format_key(format_dict): format_index for format_index, format_dict in enumerate(self.formats)}
+        self.emitted_count = 0
+
+
+    ''' the value with every format dict replaced by its index in the table, the value itself is not modified
+        cells already referring to the table are left as they are
+    '''
+    def dedupe(self, value):
+        if isinstance(value, dict):
+            deduped = {}
+            for k, v in value.items():
+                if k in FORMAT_KEYS and isinstance(v, dict):
+                    deduped[k] = self.format_index(v)
+
+                else:
+                    deduped[k] = self.dedupe(v)
+
+            return deduped
+
+        if isinstance(value, list):
+            return [self.dedupe(v) for v in value]
+
+        return value
+
+
+    ''' the index of a format dict in the table, added if it is not there yet
+    '''
+    def format_index(self, format_dict):
+        key = self.format_key(format_dict)
+        format_index = self.index.get(key)
+        if format_index is None:
+            format_index = len(self.formats)
+            self.formats.append(format_dict)
+            self.index[key] = format_index
+
+        return format_index
+
+
+    ''' the formats added since the last call, for writers that emit the table incrementally
+    '''
+    def new_formats(self):
+        new_formats = self.formats[self.emitted_count:]
+        self.emitted_count = len(self.formats)
+        return new_formats
+
+
+    def format_key(self, format_dict):
+        return json.dumps(format_dict, sort_keys=True)
+
+
+
+# the cell keys whose values are kept in the format table
+FORMAT_KEYS = ['effectiveFormat', 'userEnteredFormat']
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+'''
+'''
+
+import os
+import json
+import threading
+
+from helper.config_service import ConfigService
+from helper.logger import *
+
+class GsheetIdCache:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(GsheetIdCache, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, nesting_level=0):
+        if self._initialized:
+            return
+
+        self._cache_path = ConfigService()._temp_dir / 'gsheet-ids.json'
+        self._lock = threading.Lock()
+        self._ids = self.load(nesting_level=nesting_level)
+
+        self._initialized = True
+
+
+    ''' the cache is a dict of gsheet title -> gsheet id
+        an entry is trusted until opening the gsheet by its id fails or the opened gsheet has a different title, see invalidate
+    '''
+    def load(self, nesting_level=0):
+        if not self._cache_path.exists():
+            return {}
+
+        try:
+            with open(self._cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        except Exception as e:
+            warn(f"gsheet id cache could not be read, starting with an empty cache: {e}", nesting_level=nesting_level)
+            return {}
+
+
+    ''' write the cache atomically, must be called holding the lock
+    '''
+    def save(self, nesting_level=0):
+        cache_tmp_path = self._cache_path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            with open(cache_tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._ids, f, indent=2)
+
+            os.replace(cache_tmp_path, self._cache_path)
+
+        except Exception as e:
+            warn(f"gsheet id cache could not be written: {e}", nesting_level=nesting_level)
+
+
+    ''' the cached gsheet id for a title, None if it is not known
+    '''
+    def get(self, gsheet_title):
+        with self._lock:
+            return self._ids.get(gsheet_title)
+
+
+    ''' remember the gsheet id of a title
+    '''
+    def put(self, gsheet_title, gsheet_id, nesting_level=0):
+        with self._lock:
+            if self._ids.get(gsheet_title) == gsheet_id:
+                return
+
+            self._ids[gsheet_title] = gsheet_id
+            self.save(nesting_level=nesting_level)
+
+
+    ''' forget the gsheet id of a title, it could not be opened or it is not that gsheet any more
+    '''
+    def invalidate(self, gsheet_title, nesting_level=0):
+        with self._lock:
+            if self._ids.pop(gsheet_title, None) is not None:
+                trace(f"cached gsheet id for [{gsheet_title}] invalidated", nesting_level=nesting_level)
+                self.save(nesting_level=nesting_level)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+'''
+the documents handed from gsheet-to-json to the json-to-* renderers are either json or msgpack
+the msgpack form is a stream of records
+    ['header', INTERCHANGE_FORMAT_NAME, INTERCHANGE_FORMAT_VERSION]
+    ['keys', [key, ...]]        keys interned from here on, a dict key in later records is the index of the key in the key table
+    ['specs', {...}]            everything in the document that comes before the sections
+    ['formats', [{...}, ...]]   formats added to the format table from here on, cells refer to their formats by index in the table
+    ['section', {...}]          one record per section
+    ['end']
+the key table is built incrementally, so a writer never needs to hold more than one section
+the reading part of this module is repeated in every json-to-* package
+'''
+
+import os
+import json
+import threading
+from pathlib import Path
+
+from helper.format_table import FormatTable
+from helper.json_stream_writer import JsonStreamWriter
+
+''' writes a document as a msgpack record stream piece by piece - the specs first and then every section as soon as it is processed
+    it has the same interface as JsonStreamWriter
+'''
+class MsgpackStreamWriter(object):
+
+    def __init__(self, path, format_table=None):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        self.format_table = format_table
+        self.file = None
+        self.packer = None
+        self.key_index = {}
+        self.new_keys = []
+
+
+    def __enter__(self):
+        import msgpack
+
+        self.file = open(self.tmp_path, 'wb')
+        self.packer = msgpack.Packer(use_bin_type=True)
+        self.write_record(['header', INTERCHANGE_FORMAT_NAME, INTERCHANGE_FORMAT_VERSION])
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+
+        elif self.tmp_path.exists():
+            self.tmp_path.unlink()
+
+        return False
+
+
+    ''' start the document with everything that comes before the sections (the specs)
+    '''
+    def begin(self, document_data):
+        self.write_interned_record('specs', document_data)
+
+
+    ''' write a processed section
+    '''
+    def write_section(self, section):
+        if self.format_table is not None:
+            section = self.format_table.dedupe(section)
+            new_formats = self.format_table.new_formats()
+            if new_formats:
+                self.write_interned_record('formats', new_formats)
+
+        self.write_interned_record('section', section)
+
+
+    ''' close the document
+    '''
+    def end(self):
+        if self.format_table is not None:
+            new_formats = self.format_table.new_formats()
+            if new_formats:
+                self.write_interned_record('formats', new_formats)
+
+        self.write_record(['end'])
+
+
+    ''' write a record with its dict keys interned, preceded by the keys that are new in it
+    '''
+    def write_interned_record(self, record_type, value):
+        interned_value = self.intern(value)
+        if self.new_keys:
+            self.write_record(['keys', self.new_keys])
+            self.new_keys = []
+
+        self.write_record([record_type, interned_value])
+
+
+    def write_record(self, record):
+        self.file.write(self.packer.pack(record))
+
+
+    ''' the value with every dict key replaced by its index in the key table
+    '''
+    def intern(self, value):
+        if isinstance(value, dict):
+            interned = {}
+            for k, v in value.items():
+                key_index = self.key_index.get(k)
+                if key_index is None:
+                    key_index = len(self.key_index)
+                    self.key_index[k] = key_index
+                    self.new_keys.append(k)
+
+                interned[key_index] = self.intern(v)
+
+            return interned
+
+        if isinstance(value, (list, tuple)):
+            return [self.intern(v) for v in value]
+
+        return value
+
+
+
+''' the document stream writer for an interchange format
+'''
+def document_writer(path, interchange_format='json', compact=False, format_table=None):
+    if interchange_format == 'msgpack':
+        return MsgpackStreamWriter(path=path, format_table=format_table)
+
+    return JsonStreamWriter(path=path, compact=compact, format_table=format_table)
+
+
+''' the path of a document for an interchange format
+'''
+def document_path(output_dir, name, interchange_format='json'):
+    return Path(output_dir) / f"{name}{INTERCHANGE_FILE_EXTENSIONS.get(interchange_format, '.json')}"
+
+
+''' read a document (json or msgpack, decided by the file extension) into a dict
+'''
+def read_document(path):
+    path = Path(path)
+    if path.suffix != INTERCHANGE_FILE_EXTENSIONS['msgpack']:
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    import msgpack
+
+    # the maps are decoded with the key table as it is at that point of the stream
+    key_table = []
+    object_pairs_hook = lambda pairs: {key_table[k]: v for k, v in pairs}
+
+    document = None
+    with open(path, 'rb') as f:
+        unpacker = msgpack.Unpacker(f, raw=False, strict_map_key=False, object_pairs_hook=object_pairs_hook, max_buffer_size=0)
+        for record in unpacker:
+            record_type = record[0]
+            if record_type == 'header':
+                if record[1:] != [INTERCHANGE_FORMAT_NAME, INTERCHANGE_FORMAT_VERSION]:
+                    raise ValueError(f"[{path}] is not a supported interchange document {record[1:]}")
+
+            elif record_type == 'keys':
+                key_table.extend(record[1])
+
+            elif record_type == 'specs':
+                document = dict(record[1])
+                document['sections'] = []
+
+            elif record_type == 'formats':
+                document.setdefault('formats', []).extend(record[1])
+
+            elif record_type == 'section':
+                document['sections'].append(record[1])
+
+            elif record_type == 'end':
+                return document
+
+    raise ValueError(f"[{path}] is incomplete")
+
+
+''' convert a document between json and msgpack, the formats are decided by the file extensions
+    the cells are written as they are, unless the document has a format table or dedupe_formats is asked for, then cell formats that are not in the table yet are moved into it
+'''
+def convert_document(input_path, output_path, compact=False, dedupe_formats=False):
+    document = read_document(input_path)
+    interchange_format = 'msgpack' if Path(output_path).suffix == INTERCHANGE_FILE_EXTENSIONS['msgpack'] else 'json'
+    format_table = FormatTable(formats=document.get('formats')) if dedupe_formats or 'formats' in document else None
+    with document_writer(path=output_path, interchange_format=interchange_format, compact=compact, format_table=format_table) as writer:
+        writer.begin({key: value for key, value in document.items() if key not in ['sections', 'formats']})
+        for section in document['sections']:
+            writer.write_section(section)
+
+        writer.end()
+
+
+
+INTERCHANGE_FORMAT_NAME = 'gsheet-document'
+INTERCHANGE_FORMAT_VERSION = 1
+
+INTERCHANGE_FILE_EXTENSIONS = {'json': '.json', 'msgpack': '.msgpack'}
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+'''
+'''
+
+import os
+import json
+import threading
+from pathlib import Path
+
+''' writes the output json of a gsheet piece by piece - the specs first and then every section as soon as it is processed
+    so that only one section is held in memory, the output is the same as json.dumps of the whole document
+    the file is written under a temporary name and moved in place only when the document is complete
+    with a format table the cell formats of the sections are replaced by references and the table is written after the sections
+'''
+class JsonStreamWriter(object):
+
+    def __init__(self, path, compact=False, format_table=None):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        self.compact = compact
+        self.format_table = format_table
+        self.file = None
+        self.section_count = 0
+
+
+    def __enter__(self):
+        self.file = open(self.tmp_path, 'w')
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+
+        elif self.tmp_path.exists():
+            self.tmp_path.unlink()
+
+        return False
+
+
+    ''' start the document with everything that comes before the sections (the specs)
+    '''
+    def begin(self, document_data):
+        self.file.write('{')
+        for key, value in document_data.items():
+            self.file.write(f"{self.newline(1)}{json.dumps(key)}{self.key_separator()}{self.dumps(value, level=1)}{self.item_separator()}")
+
+        self.file.write(f"{self.newline(1)}\"sections\"{self.key_separator()}[")
+
+
+    ''' write a processed section
+    '''
+    def write_section(self, section):
+        if self.format_table is not None:
+            section = self.format_table.dedupe(section)
+
+        if self.section_count > 0:
+            self.file.write(self.item_separator())
+
+        self.file.write(f"{self.newline(2)}{self.dumps(section, level=2)}")
+        self.section_count = self.section_count + 1
+
+
+    ''' close the sections, write the format table and close the document
+    '''
+    def end(self):
+        if self.section_count > 0:
+            self.file.write(self.newline(1))
+
+        self.file.write(']')
+        if self.format_table is not None:
+            self.file.write(f"{self.item_separator()}{self.newline(1)}\"formats\"{self.key_separator()}{self.dumps(self.format_table.formats, level=1)}")
+
+        self.file.write(f"{self.newline(0)}}}")
+
+
+    ''' a value dumped to be placed at the given nesting level of the document
+    '''
+    def dumps(self, value, level):
+        if self.compact:
+            return json.dumps(value, sort_keys=False, separators=(',', ':'))
+
+        return json.dumps(value, sort_keys=False, indent=4).replace('\n', self.newline(level))
+
+
+    def newline(self, level):
+        return '' if self.compact else '\n' + ' ' * (4 * level)
+
+
+    def key_separator(self):
+        return ':' if self.compact else ': '
+
+
+    def item_separator(self):
+        return ','
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+'''
+'''
+
+import time
+import random
+import threading
+from collections import deque
+
+# googleapiclient and httplib2 are imported where they are used, they are heavy and util imports this module on every run
+
+from helper.config_service import ConfigService
+from helper.logger import *
+
+class RequestExecutor:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(RequestExecutor, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, nesting_level=0):
+        if self._initialized:
+            return
+
+        config_service = ConfigService()
+        self._try_count = max(int(config_service._gsheet_read_try_count), 1)
+        self._max_wait_seconds = float(config_service._gsheet_read_wait_seconds)
+        self._backoff_seconds = float(config_service._google_api_backoff_seconds)
+        self._requests_per_minute = config_service._google_api_requests_per_minute
+        if not isinstance(self._requests_per_minute, dict):
+            self._requests_per_minute = {'sheets': self._requests_per_minute, 'drive': self._requests_per_minute}
+
+        # request timestamps of the last minute for every api, shared by all threads
+        self._lock = threading.Lock()
+        self._request_times = {}
+
+        self._initialized = True
+
+
+    ''' execute a googleapiclient request
+        only this request is retried on rate limit (429, 403 rate limit), server (5xx) and transport errors, honouring Retry-After, else with exponential backoff and jitter
+    '''
+    def execute(self, request, nesting_level=0):
+        import httplib2
+        from googleapiclient.errors import HttpError
+
+        for attempt in range(1, self._try_count + 1):
+            self.acquire(api=self.api_name(request), nesting_level=nesting_level)
+            try:
+                return request.execute()
+
+            except HttpError as e:
+                if not self.is_retryable(e) or attempt == self._try_count:
+                    raise
+
+                wait_seconds = self.retry_after_seconds(e)
+                if wait_seconds is None:
+                    wait_seconds = self.backoff_seconds(attempt)
+
+                warn(f"google api request failed with [{e.resp.status}] (attempt {attempt}), retrying in {wait_seconds:.1f} seconds", nesting_level=nesting_level)
+
+            # transport failures (dns, tls, connection reset, timeout ..) surface from httplib2 either as its own errors or as OSError
+            except (httplib2.HttpLib2Error, OSError) as e:
+                if attempt == self._try_count:
+                    raise
+
+                wait_seconds = self.backoff_seconds(attempt)
+                warn(f"google api request failed with [{e}] (attempt {attempt}), retrying in {wait_seconds:.1f} seconds", nesting_level=nesting_level)
+
+            time.sleep(wait_seconds)
+
+
+    ''' wait until the per-minute request budget of the api allows one more request
+    '''
+    def acquire(self, api, nesting_level=0):
+        budget = self._requests_per_minute.get(api, 0)
+        if not budget:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                request_times = self._request_times.setdefault(api, deque())
+                while request_times and now - request_times[0] >= 60:
+                    request_times.popleft()
+
+                if len(request_times) < budget:
+                    request_times.append(now)
+                    return
+
+                wait_seconds = 60 - (now - request_times[0])
+
+            trace(f"[{api}] request budget of [{budget}] per minute used up, waiting {wait_seconds:.1f} seconds", nesting_level=nesting_level)
+            time.sleep(wait_seconds)
+
+
+    ''' which api (sheets/drive) a request is for, the budgets are per api
+    '''
+    def api_name(self, request):
+        uri = getattr(request, 'uri', '') or ''
+        if 'sheets.googleapis.com' in uri:
+            return 'sheets'
+
+        if '/drive/' in uri:
+            return 'drive'
+
+        return 'other'
+
+
+    ''' whether the request failed for a reason that may go away by trying again
+    '''
+    def is_retryable(self, http_error):
+        status = int(http_error.resp.status)
+        if status == 429 or status >= 500:
+            return True
+
+        # drive reports rate limits as 403
+        if status == 403:
+            content = http_error.content.decode('utf-8', errors='ignore') if isinstance(http_error.content, bytes) else str(http_error.content)
+            return 'rateLimitExceeded' in content or 'userRateLimitExceeded' in content
+
+        return False
+
+
+    ''' seconds asked to wait in the Retry-After header if any
+    '''
+    def retry_after_seconds(self, http_error):
+        retry_after = http_error.resp.get('retry-after')
+        if retry_after is None:
+            return None
+
+        try:
+            return min(float(retry_after), self._max_wait_seconds)
+        except ValueError:
+            return None
+
+
+    ''' exponential backoff with jitter, capped by the maximum wait
+    '''
+    def backoff_seconds(self, attempt):
+        wait_seconds = min(self._backoff_seconds * (2 ** (attempt - 1)), self._max_wait_seconds)
+        return wait_seconds / 2 + random.uniform(0, wait_seconds / 2)
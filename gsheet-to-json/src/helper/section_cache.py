@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+'''
+'''
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+from ggle.google_services import GoogleServices
+from helper.config_service import ConfigService
+from helper.logger import *
+from helper.asset_store import AssetStore
+from helper.util import drive_file_metadata, http_session
+
+class SectionCache:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(SectionCache, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, nesting_level=0):
+        if self._initialized:
+            return
+
+        config_service = ConfigService()
+        self._temp_dir = str(config_service._temp_dir)
+        self._cache_dir = config_service._section_cache_dir
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._initialized = True
+
+
+    ''' the fingerprint of a section is the hash of everything its output depends on
+        the section properties, the settings resolved from the configuration that shape its output (pdf page dpi, format ..), the header/footer links (or the parent's headers/footers when they are overridden) and the content hash of every worksheet it reads
+        assets (drive files, web files) are not part of it, they are revalidated when a cached section is loaded
+    '''
+    def fingerprint(self, gsheet_id, section_prop, render_settings, header_footer, parent_header_footer, worksheet_hashes):
+        fingerprint_data = {
+            'version': SECTION_CACHE_VERSION,
+            'gsheet-id': gsheet_id,
+            'section-prop': section_prop,
+            'render-settings': render_settings,
+            'header-footer': header_footer,
+            'parent-header-footer': parent_header_footer,
+            'worksheets': worksheet_hashes,
+        }
+
+        return hashlib.sha1(json.dumps(fingerprint_data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+    ''' the cached section output for a fingerprint, None if there is none or any asset it refers to has changed or is gone
+    '''
+    def load(self, fingerprint, nesting_level=0):
+        cache_path = self._cache_dir / f"{fingerprint}.json"
+        if not cache_path.exists():
+            return None
+
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+
+        except Exception as e:
+            warn(f"cached section [{fingerprint}] could not be read: {e}", nesting_level=nesting_level)
+            return None
+
+        for file_path in cached['files']:
+            if not Path(file_path).exists():
+                trace(f"cached section [{fingerprint}] refers to a missing file [{file_path}]", nesting_level=nesting_level)
+                return None
+
+        for key, validator in cached['assets'].items():
+            if not self.asset_is_current(key=key, validator=validator, nesting_level=nesting_level):
+                trace(f"cached section [{fingerprint}] refers to a changed asset [{key}]", nesting_level=nesting_level)
+                return None
+
+        return cached['section']
+
+
+    ''' cache the output of a section, with the local files it refers to and the assets ({key: validator}) it was made from
+        the assets are the ones collected while the section was processed, including the ones it does not refer to directly (the pdf its pages come from, web text)
+    '''
+    def save(self, fingerprint, section, assets, nesting_level=0):
+        files = sorted(self.local_paths(section))
+        cached = {'section': section, 'files': files, 'assets': assets}
+
+        cache_path = self._cache_dir / f"{fingerprint}.json"
+        cache_tmp_path = cache_path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            with open(cache_tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cached, f)
+
+            os.replace(cache_tmp_path, cache_path)
+
+        except Exception as e:
+            warn(f"section [{fingerprint}] could not be cached: {e}", nesting_level=nesting_level)
+
+
+    ''' all local file paths (downloads, extracted pages) a section output refers to
+    '''
+    def local_paths(self, value):
+        paths = set()
+        if isinstance(value, dict):
+            for v in value.values():
+                paths.update(self.local_paths(v))
+
+        elif isinstance(value, list):
+            for v in value:
+                paths.update(self.local_paths(v))
+
+        elif isinstance(value, str) and value.startswith(self._temp_dir):
+            paths.add(value)
+
+        return paths
+
+
+    ''' whether an asset in the asset store is still the same as its source, checked without downloading it
+        drive files by their checksum/modifiedTime, web files by a conditional HEAD request
+    '''
+    def asset_is_current(self, key, validator, nesting_level=0):
+        if AssetStore().get(key=key, validator=validator) is None:
+            return False
+
+        try:
+            if key.startswith('drive:'):
+                file = drive_file_metadata(drive_service=GoogleServices().drive_api, file_id=key[len('drive:'):], nesting_level=nesting_level+1)
+                return {'md5Checksum': file.get('md5Checksum'), 'modifiedTime': file.get('modifiedTime')} == validator
+
+            if key.startswith('web:'):
+                headers = {}
+                if validator.get('etag'):
+                    headers['If-None-Match'] = validator['etag']
+
+                if validator.get('last-modified'):
+                    headers['If-Modified-Since'] = validator['last-modified']
+
+                # a server that gives no validators can not tell whether the file changed
+                if not headers:
+                    return False
+
+                response = http_session().head(key[len('web:'):], headers=headers, allow_redirects=True, timeout=ConfigService()._http_timeout_seconds)
+                if response.status_code == 304:
+                    return True
+
+                return response.ok and {'etag': response.headers.get('ETag'), 'last-modified': response.headers.get('Last-Modified')} == validator
+
+        except Exception as e:
+            warn(f"asset [{key}] could not be revalidated: {e}", nesting_level=nesting_level)
+
+        return False
+
+
+
+# bump when the structure of the section output changes so that older cached sections are not reused
+SECTION_CACHE_VERSION = 2
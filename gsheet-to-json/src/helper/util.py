@@ -6,25 +6,21 @@ import io
 import os
 import re
 import sys
+import json
 import yaml
+import hashlib
 import shutil
+import threading
 from pathlib import Path
-
-import requests
-import urllib3
-import pandas as pd
-import numpy as np
 # from collections import defaultdict
 
-import matplotlib
-from matplotlib import font_manager
-
-from googleapiclient import errors
-from googleapiclient.http import MediaIoBaseDownload
-
-from PIL import Image
+# requests, matplotlib, googleapiclient and PIL are imported where they are used, they are heavy and many runs never need them
 
+from helper.config_service import ConfigService
 from helper.logger import *
+from helper.request_executor import RequestExecutor
+from helper.asset_store import AssetStore
+from helper.font_index import FontIndex
 
 
 # -------------------------------------------------------------------------------------------------------
@@ -32,9 +28,48 @@ from helper.logger import *
 # -------------------------------------------------------------------------------------------------------
 ''' get data from a gsheet
 '''
-def get_gsheet_data(sheets_service, spreadsheet_id, ranges=[], include_grid_data=True, nesting_level=0):
-    request = sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id, ranges=ranges, includeGridData=include_grid_data)
-    response = request.execute()
+def get_gsheet_data(sheets_service, spreadsheet_id, ranges=[], include_grid_data=True, fields=None, nesting_level=0):
+    request = sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id, ranges=ranges, includeGridData=include_grid_data, fields=fields)
+    response = RequestExecutor().execute(request, nesting_level=nesting_level)
+
+    return response
+
+
+''' get data from a gsheet through an on-disk cache
+    the cached response is reused as long as the drive modifiedTime/version of the gsheet is unchanged, which is checked with one cheap drive call, and it was fetched with the same plan
+    plan is whatever decides which part of the gsheet fetch_data gets (the worksheets, the fields), it must be json serializable
+    fetch_data is called (without arguments) to get the data when the cache is missing or stale
+'''
+def get_gsheet_data_cached(drive_service, spreadsheet_id, cache_dir, fetch_data, plan=None, nesting_level=0):
+    drive_file = RequestExecutor().execute(drive_service.files().get(fileId=spreadsheet_id, fields='modifiedTime,version'), nesting_level=nesting_level)
+    cache_path = Path(cache_dir) / f"{spreadsheet_id}.json"
+
+    if cache_path.exists():
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+
+            # the plan is compared as it comes back from json
+            if cached.get('plan') != json.loads(json.dumps(plan)):
+                trace(f"gsheet [{spreadsheet_id}] was cached with another fetch plan", nesting_level=nesting_level)
+
+            elif cached.get('version') == drive_file.get('version') and cached.get('modifiedTime') == drive_file.get('modifiedTime'):
+                trace(f"gsheet [{spreadsheet_id}] unchanged since [{drive_file.get('modifiedTime')}], using cached data", nesting_level=nesting_level)
+                return cached['response']
+
+        except Exception as e:
+            warn(f"gsheet cache for [{spreadsheet_id}] could not be read: {e}", nesting_level=nesting_level)
+
+    response = fetch_data()
+
+    # write to a temporary file first so that a reader never sees a partially written cache
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    cache_tmp_path = cache_path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+    with open(cache_tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'modifiedTime': drive_file.get('modifiedTime'), 'version': drive_file.get('version'), 'plan': plan, 'response': response}, f)
+
+    os.replace(cache_tmp_path, cache_path)
+    trace(f"gsheet [{spreadsheet_id}] cached at version [{drive_file.get('version')}]", nesting_level=nesting_level)
 
     return response
 
@@ -43,21 +78,117 @@ def get_gsheet_data(sheets_service, spreadsheet_id, ranges=[], include_grid_data
 '''
 def get_range_values(sheets_service, spreadsheet_id, range, nesting_level=0):
     request = sheets_service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=range)
-    response = request.execute()
+    response = RequestExecutor().execute(request, nesting_level=nesting_level)
     # print(response)
 
     return response.get('values', [])
 
 
-''' check whether a worksheet exists in a gsheet
+''' value of a grid cell as it is rendered with value_render FORMULA - the formula if there is one, else the user entered value
 '''
-def worksheet_exists(sheet, ws_title, nesting_level=0):
-    try:
-        ws = sheet.worksheet('title', ws_title)
+def cell_formula_value(cell_data):
+    user_entered_value = cell_data.get('userEnteredValue', {})
+    if 'formulaValue' in user_entered_value:
+        return user_entered_value['formulaValue']
+
+    if 'stringValue' in user_entered_value:
+        return user_entered_value['stringValue']
+
+    if 'numberValue' in user_entered_value:
+        number_value = user_entered_value['numberValue']
+        return int(number_value) if float(number_value).is_integer() else number_value
+
+    if 'boolValue' in user_entered_value:
+        return user_entered_value['boolValue']
+
+    return ''
+
+
+''' get the values of a worksheet (from the grid data of a spreadsheets().get response) as a matrix rendered as FORMULA
+    rows start from start_row (0 based), every row is padded to the column count of the worksheet and trailing empty rows are dropped
+'''
+def worksheet_formula_matrix(worksheet_data, start_row=0):
+    column_count = worksheet_data['properties']['gridProperties']['columnCount']
+
+    matrix = []
+    for grid_data in worksheet_data.get('data', []):
+        for row_data in grid_data.get('rowData', [])[start_row:]:
+            row = [cell_formula_value(cell_data) for cell_data in row_data.get('values', [])[:column_count]]
+            row = row + [''] * (column_count - len(row))
+            matrix.append(row)
+
+    # drop the trailing empty rows
+    while matrix and all(value == '' for value in matrix[-1]):
+        matrix.pop()
+
+    return matrix
+
+
+''' a hash of the content of a worksheet (its grid data), taken before any processing touches it
+'''
+def worksheet_content_hash(worksheet_data):
+    return hashlib.sha1(json.dumps(worksheet_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+''' get the formatted values of a worksheet column range (from the grid data of a spreadsheets().get response) the way values().get returns them
+    trailing empty cells of a row and trailing empty rows are dropped
+'''
+def worksheet_values(worksheet_data, start_col='A', end_col='ZZ', nesting_level=0):
+    start_col_index = COLUMNS.index(start_col) if start_col in COLUMNS else 0
+    end_col_index = COLUMNS.index(end_col) if end_col in COLUMNS else len(COLUMNS) - 1
+
+    values = []
+    for grid_data in worksheet_data.get('data', []):
+        for row_data in grid_data.get('rowData', []):
+            row = [cell_data.get('formattedValue', '') for cell_data in row_data.get('values', [])[start_col_index:end_col_index+1]]
+            while row and row[-1] == '':
+                row.pop()
+
+            values.append(row)
+
+    while values and values[-1] == []:
+        values.pop()
+
+    return values
+
+
+''' titles of the worksheets a worksheet refers to through =HYPERLINK("#gid=..", "title") or ='title'!range formulas
+'''
+def worksheets_linked_from_formulas(worksheet_data):
+    ws_titles = set()
+    for grid_data in worksheet_data.get('data', []):
+        for row_data in grid_data.get('rowData', []):
+            for cell_data in row_data.get('values', []):
+                formula_value = cell_data.get('userEnteredValue', {}).get('formulaValue')
+                if formula_value is None:
+                    continue
+
+                m = re.match(r'=HYPERLINK\("#gid=(?P<ws_gid>.+)",\s*"(?P<ws_title>.+)"\)', formula_value, re.IGNORECASE)
+                if m and m.group('ws_title') is not None:
+                    ws_titles.add(m.group('ws_title'))
+                    continue
+
+                m = re.match(r"='(?P<ws_name>.+)'!(?P<range>.+)", formula_value, re.IGNORECASE)
+                if m and m.group('ws_name') is not None:
+                    ws_titles.add(m.group('ws_name'))
+
+    return ws_titles
+
+
+''' A1 notation range for a whole worksheet, single quotes in the title are escaped by doubling them
+'''
+def worksheet_range(ws_title):
+    return "'{}'".format(ws_title.replace("'", "''"))
+
+
+''' check whether a worksheet exists in a gsheet (the gsheet data as a dictionary keyed by worksheet name)
+'''
+def worksheet_exists(gsheet_data, ws_title, nesting_level=0):
+    if ws_title in gsheet_data:
         return True
-    except:
-        warn(f"no worksheet ... [{ws_title}]", nesting_level=nesting_level)
-        return False
+
+    warn(f"no worksheet ... [{ws_title}]", nesting_level=nesting_level)
+    return False
 
 
 
@@ -69,22 +200,26 @@ def worksheet_exists(sheet, ws_title, nesting_level=0):
 
 '''
 def drive_file_metadata(drive_service, file_id, nesting_level=0):
-    file = drive_service.files().get(fileId=file_id,fields="id,name,mimeType").execute()
+    file = RequestExecutor().execute(drive_service.files().get(fileId=file_id,fields="id,name,mimeType,md5Checksum,modifiedTime"), nesting_level=nesting_level)
     return file
 
 
 ''' download media from drive given the id to a local path
 '''
 def download_media_from_dive(drive_service, file_id, local_path, nesting_level=0):
+    from googleapiclient.http import MediaIoBaseDownload
+
     request = drive_service.files().get_media(fileId=file_id,)
 
-    fh = io.FileIO(local_path, "wb")
-    downloader = MediaIoBaseDownload(fh, request)
+    with io.FileIO(local_path, "wb") as fh:
+        downloader = MediaIoBaseDownload(fh, request)
 
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-        trace(f"Downloaded {int(status.progress() * 100)}%", nesting_level=nesting_level)
+        done = False
+        while not done:
+            # media chunks are retried by the downloader itself, but they count against the drive request budget
+            RequestExecutor().acquire(api='drive', nesting_level=nesting_level)
+            status, done = downloader.next_chunk(num_retries=RequestExecutor()._try_count - 1)
+            trace(f"Downloaded {int(status.progress() * 100)}%", nesting_level=nesting_level)
 
     return done
 
@@ -130,20 +265,20 @@ def download_file_from_drive(drive_service, url, title, tmp_dir, nesting_level=0
     if expected_extension and not file_name.endswith(expected_extension):
         file_name = file_name + expected_extension
 
-    local_path = f"{tmp_dir}/{file_name}"
-    local_path = Path(local_path).resolve()
-
-    # if the file is already in the local_path, we do not download it
-    if Path(local_path).exists():
+    # the file is kept in the asset store keyed by the drive file id and its checksum/modifiedTime, so it is downloaded only when it is not there or has changed
+    validator = {'md5Checksum': file.get('md5Checksum'), 'modifiedTime': file.get('modifiedTime')}
+    local_path = AssetStore().get(key=f"drive:{id}", validator=validator)
+    if local_path:
         trace(f"drive file existing   at: [{local_path}]", nesting_level=nesting_level)
-        return {'file-name': file_name, 'file-type': file_type, 'file-path': str(local_path)}
+        return {'file-name': file_name, 'file-type': file_type, 'file-path': local_path}
 
     # finally download the file
     trace(f"downloading drive file id = [{id}]", nesting_level=nesting_level)
     try:
-        download_media_from_dive(drive_service=drive_service, file_id=id, local_path=local_path, nesting_level=nesting_level+1)
+        write_function = lambda path: download_media_from_dive(drive_service=drive_service, file_id=id, local_path=path, nesting_level=nesting_level+1)
+        local_path = AssetStore().put(key=f"drive:{id}", validator=validator, file_ext=expected_extension, write_function=write_function, nesting_level=nesting_level)
         trace(f"drive file downloaded at: [{local_path}]", nesting_level=nesting_level)
-        return {'file-name': file_name, 'file-type': file_type, 'file-path': str(local_path)}
+        return {'file-name': file_name, 'file-type': file_type, 'file-path': local_path}
 
     except:
         error(f"could not download : [{file_url}]", nesting_level=nesting_level)
@@ -160,9 +295,11 @@ def download_file_from_drive(drive_service, url, title, tmp_dir, nesting_level=0
         The copied file if successful, None otherwise.
 '''
 def copy_drive_file(drive_service, origin_file_id, copy_title, nesting_level):
+    from googleapiclient import errors
+
     copied_file = {'title': copy_title}
     try:
-        return drive_service.files().copy(fileId=origin_file_id, body=copied_file).execute()
+        return RequestExecutor().execute(drive_service.files().copy(fileId=origin_file_id, body=copied_file), nesting_level=nesting_level)
     
     except(errors.HttpError, error):
         error(f"An error occurred: {error}", nesting_level=nesting_level)
@@ -185,6 +322,30 @@ def read_drive_file(drive_service, drive_url, nesting_level):
     return text
 
 
+''' find the gsheets (not trashed) in drive with the given name
+'''
+def find_gsheets_by_name(drive_service, gsheet_title, nesting_level=0):
+    name = gsheet_title.replace('\\', '\\\\').replace("'", "\\'")
+    q = f"name = '{name}' and mimeType = 'application/vnd.google-apps.spreadsheet' and trashed = false"
+    files = []
+    page_token = None
+    while True:
+        request = drive_service.files().list(q=q,
+                                        spaces='drive',
+                                        fields='nextPageToken, files(id, name)',
+                                        includeItemsFromAllDrives=True,
+                                        supportsAllDrives=True,
+                                        pageToken=page_token)
+        response = RequestExecutor().execute(request, nesting_level=nesting_level)
+
+        files.extend(response.get('files', []))
+        page_token = response.get('nextPageToken', None)
+        if page_token is None:
+            break
+
+    return files
+
+
 ''' get a drive file from title
 '''
 def get_drive_file(drive_service, drive_file_name, verbose=False, nesting_level=0):
@@ -193,10 +354,11 @@ def get_drive_file(drive_service, drive_file_name, verbose=False, nesting_level=
         files = []
         page_token = None
         while True:
-            response = drive_service.files().list(q=q,
+            request = drive_service.files().list(q=q,
                                             spaces='drive',
                                             fields='nextPageToken, files(id, name, webViewLink, owners)',
-                                            pageToken=page_token).execute()
+                                            pageToken=page_token)
+            response = RequestExecutor().execute(request, nesting_level=nesting_level)
 
             files.extend(response.get('files', []))
             page_token = response.get('nextPageToken', None)
@@ -208,8 +370,10 @@ def get_drive_file(drive_service, drive_file_name, verbose=False, nesting_level=
                 if len(files) > 1:
                     warn(f"multiple drive files found for [{drive_file_name}] ... ", nesting_level=nesting_level)
 
+                # the locations of all the files are traced together
+                hierarchies = get_file_hierarchies(drive_service=drive_service, file_ids=[drive_file['id'] for drive_file in files], nesting_level=nesting_level)
                 for i, drive_file in enumerate(files, start=1):
-                    full_path = get_file_hierarchy(drive_service=drive_service, file_id=drive_file['id'])
+                    full_path = hierarchies[drive_file['id']]
                     path_name = " -> ".join([item['name'] for item in reversed(full_path)])
                     owner = drive_file['owners'][0]['emailAddress']
                     if i == 1:
@@ -225,7 +389,7 @@ def get_drive_file(drive_service, drive_file_name, verbose=False, nesting_level=
         return None
 
 
-''' Recursively retrieves the full parent folder hierarchy for a given file ID.
+''' Retrieves the full parent folder hierarchy for a given file ID.
 
 Args:
     file_id (str): The ID of the file to trace.
@@ -236,40 +400,75 @@ Returns:
             Example: [{'id': 'fileId', 'name': 'MyFile'}, {'id': 'parent1Id', 'name': 'Folder A'}, ...]
 '''
 def get_file_hierarchy(drive_service, file_id, nesting_level=0):
-    hierarchy = []
-    current_id = file_id
+    return get_file_hierarchies(drive_service=drive_service, file_ids=[file_id], nesting_level=nesting_level)[file_id]
+
+
+''' the parent folder hierarchies of several files, a dict of file id -> hierarchy as returned by get_file_hierarchy
+    the files are traced upwards together, every level is fetched with drive batch requests and a folder shared by several files is fetched only once
+'''
+def get_file_hierarchies(drive_service, file_ids, nesting_level=0):
+    metadata = {}
+    ids_to_fetch = list(dict.fromkeys(file_ids))
+    while ids_to_fetch:
+        fetched = get_drive_files_batch(drive_service=drive_service, file_ids=ids_to_fetch, fields='id, name, parents', nesting_level=nesting_level)
+        metadata.update(fetched)
+
+        # Drive can have multiple parents; we typically follow the first one
+        parent_ids = [file_metadata['parents'][0] for file_metadata in fetched.values() if file_metadata.get('parents')]
+        ids_to_fetch = [parent_id for parent_id in dict.fromkeys(parent_ids) if parent_id not in metadata]
+
+    hierarchies = {}
+    for file_id in file_ids:
+        # The hierarchy is built from the file upward, it ends at the root (My Drive) or at a file that could not be fetched
+        hierarchy = []
+        current_id = file_id
+        while current_id in metadata and len(hierarchy) <= len(metadata):
+            hierarchy.append({'id': current_id, 'name': metadata[current_id].get('name')})
+            parent_ids = metadata[current_id].get('parents')
+            current_id = parent_ids[0] if parent_ids else None
+
+        hierarchies[file_id] = hierarchy
+
+    return hierarchies
+
+
+''' drive file metadata of several files, a dict of file id -> metadata with the given fields
+    the files are fetched with drive batch requests of up to DRIVE_BATCH_SIZE files, a file whose part of the batch failed is fetched once more on its own, a file that still fails is left out
+'''
+def get_drive_files_batch(drive_service, file_ids, fields, nesting_level=0):
+    results = {}
+    failed_ids = []
+
+    def batch_callback(request_id, response, exception):
+        if exception is None:
+            results[request_id] = response
+
+        else:
+            failed_ids.append(request_id)
+
+    for start in range(0, len(file_ids), DRIVE_BATCH_SIZE):
+        batch_ids = file_ids[start:start + DRIVE_BATCH_SIZE]
+        batch = drive_service.new_batch_http_request(callback=batch_callback)
+        for file_id in batch_ids:
+            # every request in a batch counts against the drive request budget
+            RequestExecutor().acquire(api='drive', nesting_level=nesting_level)
+            batch.add(drive_service.files().get(fileId=file_id, fields=fields), request_id=file_id)
 
-    # Use a loop to trace back the parents
-    while current_id:
         try:
-            # 1. Fetch file/folder metadata
-            # We specifically request the 'id', 'name', and 'parents' fields
-            file_metadata = drive_service.files().get(
-                fileId=current_id, 
-                fields='id, name, parents'
-            ).execute()
-            
-            file_name = file_metadata.get('name')
-            parent_ids = file_metadata.get('parents')
-            
-            # 2. Add the current item to the hierarchy list
-            hierarchy.append({'id': current_id, 'name': file_name})
-
-            # 3. Determine the next parent ID for the next iteration
-            if parent_ids:
-                # Drive can have multiple parents; we typically follow the first one
-                # for a single path, or you could adapt this to trace all paths.
-                current_id = parent_ids[0] 
-            else:
-                # No more parents means we have reached the root (My Drive)
-                current_id = None
+            batch.execute()
 
         except Exception as e:
-            error(f"An error occurred while fetching ID {current_id}: {e}")
-            break
-    
-    # The hierarchy is built from the file upward; return it in that order.
-    return hierarchy
+            warn(f"drive batch request failed: {e}", nesting_level=nesting_level)
+            failed_ids.extend(file_id for file_id in batch_ids if file_id not in results and file_id not in failed_ids)
+
+    for file_id in failed_ids:
+        try:
+            results[file_id] = RequestExecutor().execute(drive_service.files().get(fileId=file_id, fields=fields), nesting_level=nesting_level)
+
+        except Exception as e:
+            error(f"An error occurred while fetching ID {file_id}: {e}", nesting_level=nesting_level)
+
+    return results
 
 
 
@@ -292,37 +491,89 @@ def download_file_from_web(url, tmp_dir, nesting_level=0):
     file_name = file_url.split('/')[-1].strip()
     file_type = FILE_EXT_TO_MIME_TYPE_MAP.get(file_ext, None)
 
-    # download pdf in url into localpath
+    # download pdf in url into the asset store
+    local_path = download_web_asset(url=file_url, file_ext=file_ext, nesting_level=nesting_level)
+    if local_path is None:
+        error(f"could not download : [{file_url}]", nesting_level=nesting_level)
+        return None
+
+    return {'file-name': file_name, 'file-type': file_type, 'file-path': local_path}
+
+
+''' download a web url into the asset store and return the local path
+    the url is requested conditionally (ETag/Last-Modified) when it is already in the store, so an unchanged file is never downloaded again
+'''
+def download_web_asset(url, file_ext, nesting_level=0):
+    key = f"web:{url}"
+    entry = AssetStore().entry(key=key)
+
+    headers = {}
+    if entry:
+        if entry['validator'].get('etag'):
+            headers['If-None-Match'] = entry['validator']['etag']
+
+        if entry['validator'].get('last-modified'):
+            headers['If-Modified-Since'] = entry['validator']['last-modified']
+
     try:
-        local_path = f"{tmp_dir}/{file_name}"
-        local_path = Path(local_path).resolve()
-        # if the pdf is already in the local_path, we do not download it
-        if Path(local_path).exists():
-            trace(f"file existing   [{file_url}]", nesting_level=nesting_level)
-            # pass
-        else:
-            file_data = requests.get(file_url).content
-            with open(local_path, 'wb') as handler:
-                handler.write(file_data)
+        # the response is closed on every path, so that its connection goes back to the pool
+        with http_session().get(url, headers=headers, stream=True, timeout=ConfigService()._http_timeout_seconds) as response:
+            if response.status_code == 304 and entry:
+                trace(f"file existing   [{url}]", nesting_level=nesting_level)
+                return AssetStore().touch(key=key)
+
+            if not response.ok:
+                warn(f"{response} could not download : [{url}]", nesting_level=nesting_level)
+                return None
+
+            def write_function(path):
+                with open(path, 'wb') as handle:
+                    for block in response.iter_content(ConfigService()._http_chunk_size_kb * 1024):
+                        if not block:
+                            break
 
-            trace(f"file downloaded [{file_url}]", nesting_level=nesting_level)
+                        handle.write(block)
 
-        return {'file-name': file_name, 'file-type': file_type, 'file-path': str(local_path)}
-    except:
-        error(f"could not download : [{file_url}]", nesting_level=nesting_level)
+            validator = {'etag': response.headers.get('ETag'), 'last-modified': response.headers.get('Last-Modified')}
+            local_path = AssetStore().put(key=key, validator=validator, file_ext=file_ext, write_function=write_function, nesting_level=nesting_level)
+            trace(f"file downloaded [{url}]", nesting_level=nesting_level)
+
+            return local_path
+
+    except Exception as err:
+        warn(f"could not download : [{url}] : {err}", nesting_level=nesting_level)
         return None
 
 
+''' the shared keep-alive http session used for all web downloads, connections are pooled per host
+'''
+def http_session():
+    import requests
+
+    global HTTP_SESSION
+    with HTTP_SESSION_LOCK:
+        if HTTP_SESSION is None:
+            config_service = ConfigService()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=config_service._http_pool_hosts, pool_maxsize=config_service._http_pool_connections_per_host)
+            HTTP_SESSION = requests.Session()
+            HTTP_SESSION.mount('http://', adapter)
+            HTTP_SESSION.mount('https://', adapter)
+
+    return HTTP_SESSION
+
+
 ''' read content from a web url
+    the content is kept in the asset store like any web file, so it is revalidated rather than downloaded again and a cached section that shows it knows when it changes
 '''
 def read_web_content(web_url, nesting_level=0):
     url = web_url.strip()
 
     # read content from url
     try:
-        http = urllib3.PoolManager()
-        response = http.request('GET', url)
-        text = response.data.decode('utf-8')
+        local_path = download_web_asset(url=url, file_ext='.txt', nesting_level=nesting_level)
+        with open(local_path, 'rb') as f:
+            text = f.read().decode('utf-8')
+
         return text
     except:
         error(f"could not read content from url: [{web_url}]", nesting_level=nesting_level)
@@ -336,6 +587,8 @@ def read_web_content(web_url, nesting_level=0):
 ''' get image metadata using Pillow
 '''
 def image_meta_pillow(im_path, nesting_level=0):
+    from PIL import Image
+
     im = Image.open(im_path)
     width, height = im.size
 
@@ -351,6 +604,8 @@ def image_meta_pillow(im_path, nesting_level=0):
     {'height': height, 'width': width, 'dpi': dpi, 'size': (size)}
 '''
 def image_params_from_image(local_path, row_height, mode, formula, formula_parts, nesting_level=0):
+    from PIL import Image
+
     try:
         im = Image.open(local_path)
         im_width, im_height = im.size
@@ -395,54 +650,60 @@ def image_params_from_image(local_path, row_height, mode, formula, formula_parts
     "http://documents.biasl.net/data/projects/rhd/filling-station-367x221.png", 3'\
     or this
     "http://documents.biasl.net/data/res/logo/rhd-logo-200x200.png", 4, 150, 150
+    the image is kept in the asset store, tmp_dir is not used any more
 '''
 def download_image_from_formula(image_formula, tmp_dir, row_height, nesting_level=0):
+    url, file_ext = image_url_from_formula(image_formula=image_formula, nesting_level=nesting_level)
+    if url is None:
+        return None
+
+    # download image in url into the asset store
+    local_path = download_image_from_url(url=url, file_ext=file_ext, nesting_level=nesting_level)
+    if local_path is None:
+        return None
+
+    return image_from_formula(image_formula=image_formula, url=url, local_path=local_path, row_height=row_height, nesting_level=nesting_level)
+
+
+''' from inside an IMAGE formula get the url and the extension of the image file
+'''
+def image_url_from_formula(image_formula, nesting_level=0):
     s = image_formula.replace('"', '').split(',')
-    url, local_path, mode = None, None, None
 
     # the first item is url
-    if len(s) >= 1:
-        url = s[0]
+    url = s[0]
 
-        # localpath is the last term if it ends with png/jpg/gif/webp, if not
-        url_splitted = url.split('/')
-        if url_splitted[-1].endswith((tuple(SUPPORTED_FILE_FORMATS))):
-            local_path = f"{tmp_dir}/{url_splitted[-1]}"
+    # extension is of the last term if it ends with png/jpg/gif/webp, if not
+    url_splitted = url.split('/')
+    if url_splitted[-1].endswith((tuple(SUPPORTED_FILE_FORMATS))):
+        file_ext = Path(url_splitted[-1]).suffix
 
-        # if it is owncloud, (https://storage.brilliant.com.bd/s/IPO46mdbcetahMf/download) we use the penaltimate term and append a .png
-        elif len(url_splitted) >= 6 and 'storage.brilliant.com.bd' in url_splitted[2]:
-            local_path = f"{tmp_dir}/{url_splitted[-2]}.png"
+    # if it is owncloud, (https://storage.brilliant.com.bd/s/IPO46mdbcetahMf/download) it is a .png
+    elif len(url_splitted) >= 6 and 'storage.brilliant.com.bd' in url_splitted[2]:
+        file_ext = '.png'
 
-        else:
-            warn(f"url pattern unknown for file: {url}", nesting_level=nesting_level)
-            return None
+    else:
+        warn(f"url pattern unknown for file: {url}", nesting_level=nesting_level)
+        return None, None
 
-        local_path = Path(local_path).resolve()
+    return url, file_ext
 
-        # download image in url into localpath
-        try:
-            # if the image is already in the local_path, we do not download it
-            if Path(local_path).exists():
-                trace(f"image existing   at: [{local_path}]", nesting_level=nesting_level)
-            else:
-                response = requests.get(url, stream=True)
-                if not response.ok:
-                    warn(f"{response} could not download image: [{url}]", nesting_level=nesting_level)
-                    return None
 
-                with open(local_path, 'wb') as handle:
-                    for block in response.iter_content(512):
-                        if not block:
-                            break
+''' download an image from a web url into the asset store, returns the local path or None if the image is not available
+'''
+def download_image_from_url(url, file_ext, nesting_level=0):
+    local_path = download_web_asset(url=url, file_ext=file_ext, nesting_level=nesting_level)
+    if local_path:
+        debug(f"image available at: [{local_path}]", nesting_level=nesting_level)
 
-                        handle.write(block)
+    return local_path
 
-                debug(f"image downloaded at: [{local_path}]", nesting_level=nesting_level)
 
-        except Exception as err:
-            warn(f"could not download : [{url}]", nesting_level=nesting_level)
-            print(Exception, err)
-            return None
+''' the image dict for an IMAGE formula whose image is already downloaded at local path
+    {'url': url, 'path': local_path, 'mode': mode, 'height': height, 'width': width, 'dpi': dpi, 'size': (size)}
+'''
+def image_from_formula(image_formula, url, local_path, row_height, nesting_level=0):
+    s = image_formula.replace('"', '').split(',')
 
     # the second item is mode - can be 1, 3 or 4
     if len(s) >= 2:
@@ -625,19 +886,15 @@ def get_the_font_to_use(font_spec, nesting_level=0):
 ''' check whether a font is installed or not
 '''
 def is_font_installed(font_name):
-    # Get a list of all available system fonts
-    available_fonts = font_manager.findSystemFonts(fontpaths=None, fontext='ttf')
-    
-    # Extract the actual names of the fonts
-    font_names = [font_manager.FontProperties(fname=f).get_name() for f in available_fonts]
-    
-    # Check if your font is in the list (case-insensitive)
-    return font_name.lower() in [f.lower() for f in font_names]
+    # the system fonts are scanned only once, see FontIndex
+    return FontIndex().has_font(font_name)
 
 
 ''' remove matplotlib cache
 '''
 def remove_matplotlib_cache(nesting_level=0):
+    import matplotlib
+
     # Find the cache directory
     cache_dir = matplotlib.get_cachedir(nesting_level=nesting_level)
     trace(f"Clearing cache at: {cache_dir}")
@@ -669,92 +926,93 @@ def try_numeric(value):
         return str(value).strip()
 
 
-''' create a hierchical dict from 2D array where first few rows are headers and rest are data
+''' compile the column plan of a header block, done once per header layout
+    header cells are forward-filled from the left (merged parent headers), a column's path runs up to its last non-empty header cell
+    returns {'key-index': index of the key column, 'columns': [(column index, path, transformer), ...]} or None if there is no key column
 '''
-def data_to_hierarchical_dict(data, header_row_start, header_row_end, key_column_name='key', nesting_level=0):
-    # 1. Slice Header Block
-    start_idx = header_row_start - 1
-    end_idx = header_row_end
-    header_slice = data[start_idx:end_idx]
-    
-    # Create DataFrame and clean whitespace
-    header_df = pd.DataFrame(header_slice).transpose()
-    header_df = header_df.map(lambda x: str(x).strip() if pd.notna(x) and str(x).strip() != '' else np.nan)
+def compile_spec_plan(header_rows, key_column_name='key'):
+    plan_key = (header_rows, key_column_name)
+    if plan_key in SPEC_PLAN_CACHE:
+        return SPEC_PLAN_CACHE[plan_key]
 
-    # Create the filled version for merged parents
-    header_ffilled = header_df.ffill(axis=0)
-    
-    # 2. Refined Path Generation (The Fix)
+    column_count = max((len(header_row) for header_row in header_rows), default=0)
+    filled_row_values = [None] * len(header_rows)
     col_paths = []
-    for i in range(len(header_df)):
-        original_col = header_df.iloc[i].tolist()
-        filled_col = header_ffilled.iloc[i].tolist()
-        
-        # Find the index of the last NON-EMPTY cell in the original data
-        # If Row 2 is 'url' and 3,4,5 are empty, last_valid_idx will be 1 (0-based)
+    for col_idx in range(column_count):
         last_valid_idx = -1
-        for idx, val in enumerate(original_col):
-            if pd.notna(val):
-                last_valid_idx = idx
-        
-        if last_valid_idx >= 0:
-            # Take the filled names only up to the last original cell found
-            col_paths.append(filled_col[:last_valid_idx + 1])
-        else:
-            col_paths.append([])
+        for row_idx, header_row in enumerate(header_rows):
+            header_value = header_row[col_idx] if col_idx < len(header_row) else None
+            header_value = str(header_value).strip() if header_value is not None else ''
+            if header_value != '':
+                filled_row_values[row_idx] = header_value
+                last_valid_idx = row_idx
 
-    # 3. Process Data Rows
-    raw_data = data[end_idx:]
-    result_dict = {}
+        col_paths.append(tuple(filled_row_values[:last_valid_idx + 1]))
 
-    # Find the 'key' column index
-    try:
-        # Match 'key' against the last element of each path
-        key_idx = [p[-1] if p else "" for p in col_paths].index(key_column_name)
-        
-    except ValueError:
+    # match the key against the last element of each path
+    key_idx = next((col_idx for col_idx, path in enumerate(col_paths) if (path[-1] if path else '') == key_column_name), None)
+    if key_idx is None:
+        plan = None
+
+    else:
+        columns = [(col_idx, path, SPEC_KEY_TRANSFORMATIONS.get(path)) for col_idx, path in enumerate(col_paths) if path and col_idx != key_idx]
+        plan = {'key-index': key_idx, 'columns': columns}
+
+    SPEC_PLAN_CACHE[plan_key] = plan
+    return plan
+
+
+''' the numeric value of a cell, spec sheets repeat the same few values so parsed values are memoised
+'''
+def spec_cell_value(value):
+    if value in SPEC_VALUE_CACHE:
+        return SPEC_VALUE_CACHE[value]
+
+    numeric_value = try_numeric(value)
+    SPEC_VALUE_CACHE[value] = numeric_value
+    return numeric_value
+
+
+''' create a hierchical dict from 2D array where first few rows are headers and rest are data
+'''
+def data_to_hierarchical_dict(data, header_row_start, header_row_end, key_column_name='key', nesting_level=0):
+    header_rows = tuple(tuple(header_row) for header_row in data[header_row_start - 1:header_row_end])
+    plan = compile_spec_plan(header_rows=header_rows, key_column_name=key_column_name)
+    if plan is None:
         return f"Error: Key column '{key_column_name}' not found."
 
-    for row in raw_data:
-        # Ensure row length matches paths
-        row = list(row) + [None] * (len(col_paths) - len(row))
-        
-        row_id = str(row[key_idx]).strip()
+    key_idx = plan['key-index']
+    columns = plan['columns']
+
+    result_dict = {}
+    for row in data[header_row_end:]:
+        row_id = str(row[key_idx]).strip() if key_idx < len(row) else ''
         if not row_id or row_id == 'None' or row_id == 'nan':
             continue
 
+        row_length = len(row)
         row_obj = {}
-        for col_idx, cell_value in enumerate(row):
-            val = try_numeric(cell_value)
-            
-            # Skip key column, nulls, or columns with no headers
-            if col_idx == key_idx or val is None or not col_paths[col_idx]:
+        for col_idx, path, transformer in columns:
+            if col_idx >= row_length:
+                break
+
+            val = spec_cell_value(row[col_idx])
+            if val is None:
                 continue
-            
-            path = col_paths[col_idx]
 
-            # --- GENERIC TRANSFORMATION LOGIC ---
-            if SPEC_KEY_TRANSFORMATIONS:
-                path_tuple = tuple(path)
-                if path_tuple in SPEC_KEY_TRANSFORMATIONS:
-                    val = SPEC_KEY_TRANSFORMATIONS[path_tuple](val)
+            if transformer:
+                val = transformer(val)
 
-            
-            # Build Nesting
+            # build nesting, a leaf where a branch is expected (collision) drops the value
             current_level = row_obj
-            for i, step in enumerate(path):
-                if i == len(path) - 1:
-                    current_level[step] = val
-                else:
-                    if step not in current_level:
-                        current_level[step] = {}
-                    
-                    # If we hit a leaf that was supposed to be a branch (collision)
-                    if not isinstance(current_level[step], dict):
-                        break
-                    
-                    current_level = current_level[step]
-        
+            for step in path[:-1]:
+                current_level = current_level.setdefault(step, {})
+                if not isinstance(current_level, dict):
+                    break
+
+            else:
+                current_level[path[-1]] = val
+
         result_dict[row_id] = row_obj
 
     return result_dict
@@ -809,6 +1067,13 @@ SPEC_KEY_TRANSFORMATIONS = {
     ('inline-image', 'extend-container-height'): yes_to_bool,
 }
 
+# the header/footer keys of a section
+SECTION_HEADER_FOOTER_KEYS = ['header-odd', 'header-even', 'header-first', 'footer-odd', 'footer-even', 'footer-first']
+
+# compiled spec column plans keyed by (header rows, key column name) and parsed spec cell values
+SPEC_PLAN_CACHE = {}
+SPEC_VALUE_CACHE = {}
+
 SUPPORTED_FILE_FORMATS = ['.pdf', '.png', '.jpg', '.gif', '.webp']
 IMAGE_FORMATS = ['.png', '.jpg', '.gif', '.webp']
 
@@ -831,6 +1096,19 @@ MIME_TYPE_TO_FILE_EXT_MAP = {
     'image/webp': '.webp'
 }
 
+# the fields of a spreadsheets().get response that are needed to plan which worksheets are to be fetched
+GSHEET_METADATA_FIELDS = 'spreadsheetId,properties.title,sheets.properties'
+
+# the fields of a spreadsheets().get response with grid data that the json-to-* renderers (and the processors) actually consume
+GSHEET_GRID_FIELDS = 'spreadsheetId,properties.title,sheets(properties,merges,data(startRow,startColumn,rowMetadata.pixelSize,columnMetadata.pixelSize,rowData.values(formattedValue,userEnteredValue,effectiveValue,effectiveFormat,userEnteredFormat,textFormatRuns,note,hyperlink)))'
+
+# the most requests drive accepts in one batch request
+DRIVE_BATCH_SIZE = 100
+
+# the shared http session, created on first use
+HTTP_SESSION = None
+HTTP_SESSION_LOCK = threading.Lock()
+
 DPI = 72
 
 JPEG_QUALITY_DEFAULT = 90
@@ -891,6 +1169,17 @@ MASTER_TOC_COLUMNS = {
     "jpeg-quality" : {"availability": "preferred", "blank-allowed": True, "value-if-missing": '90'},
     "page-list" : {"availability": "preferred", "blank-allowed": True, "value-if-missing": ""},
 
+    # *dpi* - if this section's content-type is *pdf* and the link is a pdf file, the resolution the pages are rasterized at
+    # 1. Value can be blank in which case it defaults to the pdf-page-dpi of the configuration (typically 72)
+    # 2. higher values give sharper pages in print at the cost of larger images and longer rasterization
+    "dpi" : {"availability": "preferred", "blank-allowed": True, "value-if-missing": ""},
+
+    # *page-format* - if this section's content-type is *pdf* and the link is a pdf file, how the pages are embedded
+    # 1. Value can be blank or *jpg* which means the pages are rasterized into jpeg images (see jpeg-quality)
+    # 2. Value can be *png* which means the pages are rasterized into lossless png images
+    # 3. Value can be *pdf* which means the pages are not rasterized at all, the renderers embed the original pdf pages (or a vector conversion of them) where the output format allows it
+    "page-format" : {"availability": "preferred", "blank-allowed": True, "value-if-missing": ""},
+
     # *autocrop* - if this section's content-type is *pdf* and the link is a pdf file or any image file, the option decides whether the images will be automatically cropped or not
     # 1. Value can be blank which means the image will not be cropped automatically and remain as it is in the source
     # 2. Value can be *Yes* which means the image will be cropped automatically discarding white borders, padding and margin area if there are any from all sides 
@@ -1,24 +1,42 @@
 #!/usr/bin/env python
 '''
 '''
-import json
+import sys
 import time
 import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# the startup imports are timed, see check_import_budget
+IMPORT_START_TIME = time.perf_counter()
 
 from ggle.google_services import GoogleServices
 from ggle.gsheet_helper import GsheetHelper
+from helper.asset_store import AssetStore
 from helper.config_service import ConfigService
+from helper.font_index import FontIndex
+from helper.format_table import FormatTable
+from helper.interchange import document_path, document_writer
 from helper.logger import *
 
+IMPORT_SECONDS = time.perf_counter() - IMPORT_START_TIME
+
+# modules that are expensive to import and should only be loaded when a run needs them
+HEAVY_MODULES = ['pandas', 'numpy', 'matplotlib', 'PIL', 'cv2', 'pdf2image', 'requests', 'urllib3']
+
 
 class JsonFromGsheet(object):
 
     def __init__(self):
         self.start_time = int(round(time.time() * 1000))
 
-    def run(self, config_file, gsheet=None):
+    def run(self, config_file, gsheet=None, incremental=False):
         # configuration
         config_service = ConfigService(config_file=config_file, nesting_level=0)
+        if incremental:
+            config_service._incremental = True
+
+        self.check_import_budget(budget_ms=config_service._import_time_budget_ms)
 
         # initialize GoogleServices
         google_services = GoogleServices(json_path=config_service._google_cred_json_path, nesting_level=0)
@@ -28,28 +46,99 @@ class JsonFromGsheet(object):
         if gsheet:
             config_service._gsheet_list = [gsheet]
 
-        # process gsheets one by one
-        gsheet_helper = GsheetHelper()
-        for gsheet_title in config_service._gsheet_list:
-            output_json_path = f"{config_service._output_dir}/{gsheet_title}.json"
-            gsheet_data = gsheet_helper.read_gsheet(gsheet_title=gsheet_title, gsheet_url=None, parent=None, nesting_level=0)
-            with open(output_json_path, "w") as f:
-                f.write(json.dumps(gsheet_data, sort_keys=False, indent=4))
+        # process gsheets one by one, or in batch mode each in a worker process
+        process_count = min(int(config_service._batch_process_count), len(config_service._gsheet_list))
+        if process_count > 1:
+            document_count = self.run_batch(config_file=config_file, process_count=process_count)
 
+        else:
+            document_count = 0
+            for gsheet_title in config_service._gsheet_list:
+                document_count = document_count + process_document(gsheet_title=gsheet_title)
+
+
+        # the asset store is trimmed to its size cap once, after every document of the run is written, the assets the run used are kept
+        AssetStore().evict(keep_since=self.start_time / 1000, nesting_level=0)
 
         # tear down 
         self.end_time = int(round(time.time() * 1000))
-        info(f"{gsheet_helper.current_document_index+1} documents/gsheets processed")
+        info(f"{document_count} documents/gsheets processed")
         info(f"script took {(self.end_time - self.start_time)/1000} seconds")
         # input("Press Enter to continue...")
 
 
+    ''' process the gsheets of the gsheet list in a pool of worker processes, returns the number of documents processed
+        the font index is built (or validated) here once so that the workers only load it
+    '''
+    def run_batch(self, config_file, process_count):
+        config_service = ConfigService()
+        FontIndex().families()
+
+        info(f"processing [{len(config_service._gsheet_list)}] gsheets in [{process_count}] worker processes")
+        document_count = 0
+        # spawned workers start clean, they do not inherit the google api clients and threads of this process
+        with ProcessPoolExecutor(max_workers=process_count, mp_context=multiprocessing.get_context('spawn'), initializer=init_batch_worker, initargs=(config_file, config_service._incremental, process_count)) as pool:
+            futures = {pool.submit(process_document, gsheet_title=gsheet_title): gsheet_title for gsheet_title in config_service._gsheet_list}
+            for future in as_completed(futures):
+                document_count = document_count + future.result()
+                info(f"[{futures[future]}] processed")
+
+        return document_count
+
+
+    ''' report startup imports that took longer than the budget, with the heavy modules that got imported eagerly
+    '''
+    def check_import_budget(self, budget_ms):
+        import_ms = IMPORT_SECONDS * 1000
+        eager_modules = [module_name for module_name in HEAVY_MODULES if module_name in sys.modules]
+        if budget_ms and import_ms > budget_ms:
+            warn(f"startup imports took {import_ms:.0f} ms, more than the budget of {budget_ms} ms, heavy modules imported eagerly {eager_modules}")
+
+        else:
+            trace(f"startup imports took {import_ms:.0f} ms, heavy modules imported eagerly {eager_modules}")
+
+
+''' read a top-level gsheet (with its nested gsheets) and write it out, the gsheet data is released once the document is written
+    returns the number of documents/gsheets read
+'''
+def process_document(gsheet_title):
+    config_service = ConfigService()
+    gsheet_helper = GsheetHelper()
+
+    output_path = document_path(output_dir=config_service._output_dir, name=gsheet_title, interchange_format=config_service._interchange_format)
+    # the sections are streamed to the output (json or msgpack) as they are processed
+    # the cell formats are replaced by references to a document-level format table
+    format_table = FormatTable() if config_service._format_table else None
+    with document_writer(path=output_path, interchange_format=config_service._interchange_format, compact=config_service._compact_json, format_table=format_table) as section_writer:
+        gsheet_helper.read_gsheet(gsheet_title=gsheet_title, gsheet_url=None, parent=None, section_writer=section_writer, nesting_level=0)
+
+    AssetStore().flush_usage(nesting_level=0)
+
+    return gsheet_helper.release_documents()
+
+
+''' set up a batch worker process the way run does, the google api request budgets are split among the workers
+'''
+def init_batch_worker(config_file, incremental, process_count):
+    config_service = ConfigService(config_file=config_file, nesting_level=0)
+    config_service._incremental = incremental
+
+    requests_per_minute = config_service._google_api_requests_per_minute
+    if not isinstance(requests_per_minute, dict):
+        requests_per_minute = {'sheets': requests_per_minute, 'drive': requests_per_minute}
+
+    config_service._google_api_requests_per_minute = {api: max(int(budget) // process_count, 1) if budget else 0 for api, budget in requests_per_minute.items()}
+
+    GoogleServices(json_path=config_service._google_cred_json_path, nesting_level=0)
+
+
 if __name__ == '__main__':
 	# construct the argument parse and parse the arguments
 	ap = argparse.ArgumentParser()
 	ap.add_argument("-c", "--config", required=True, help="configuration yml path")
 	ap.add_argument("-g", "--gsheet", required=False, help="gsheet name to override gsheet list provided in configuration")
+	ap.add_argument("-i", "--incremental", required=False, action='store_true', help="reuse the sections that are unchanged since the last run")
 	args = vars(ap.parse_args())
 
 	generator = JsonFromGsheet()
-	generator.run(config_file=args["config"], gsheet=args["gsheet"])
+	generator.run(config_file=args["config"], gsheet=args["gsheet"], incremental=args["incremental"])
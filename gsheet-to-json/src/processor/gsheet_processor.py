@@ -14,7 +14,8 @@ def process(gsheet, section_data, worksheet_cache, gsheet_data, current_document
     info(f"processing gsheet id = [{gsheet_id}] : [{gsheet_title}]", nesting_level=nesting_level)
     
     _gsheethelper = GsheetHelper()
-    _data = _gsheethelper.read_gsheet(gsheet_title=gsheet_title, gsheet_url=gsheet_url, parent=section_data, nesting_level=nesting_level+1)
+    # a gsheet linked more than once in the document tree is read only once
+    _data = _gsheethelper.read_nested_gsheet(gsheet_title=gsheet_title, gsheet_url=gsheet_url, parent=section_data, nesting_level=nesting_level+1)
 
     info(f"processed  gsheet id = [{gsheet_id}] : [{gsheet_title}]", nesting_level=nesting_level)
 
@@ -2,19 +2,27 @@
 '''
 '''
 
+import io
+import os
+import re
+import json
+import math
+import hashlib
+import threading
 from pathlib import Path
-import cv2
-import numpy as np
-import pdf2image
+from concurrent.futures import ThreadPoolExecutor
+# pdf2image, PIL and numpy are imported where they are used, this module is only needed for pdf sections
 # import pdf2image.exceptions
-from PIL import Image, ImageChops, ImageOps
 
 from ggle.google_services import GoogleServices
 from helper.config_service import ConfigService
+from helper.file_hash import file_content_hash
 from helper.logger import *
 from helper.util import *
 
 def process(gsheet, section_data, worksheet_cache, gsheet_data, current_document_index, nesting_level=0):
+    import pdf2image
+
     pdf_title = section_data['section-prop']['link']
     pdf_url = section_data['section-prop']['link-target']
 
@@ -37,76 +45,60 @@ def process(gsheet, section_data, worksheet_cache, gsheet_data, current_document
         file_path = data['file-path']
         file_name = data['file-name']
         file_type = data['file-type']
-        if file_name.endswith('pdf'):
-            file_name = file_name[:-4]
 
-        file_name = file_name + '__'
+        images = []
 
         # if it is a pdf
         if file_type == 'application/pdf':
-            # consider page-list
-            page_list = section_data['section-prop']['page-list']
-            p_lists = []
-            if page_list is None or page_list.strip() == '':
-                p_lists.append(':')
-                pass
-            else:
-                pls = page_list.split(',')
-                for pl in pls:
-                    p_lists.append(pl.replace(' ', ''))
-
-
             try:
                 # split pages into images, jpeg_quality to be considered
-                jpeg_quality = section_data['section-prop']['jpeg-quality'].strip()
-                if jpeg_quality is None or jpeg_quality == '':
-                    jpeg_quality = JPEG_QUALITY_DEFAULT
-                    # trace(f"jpeg-quality not specified explicitly .. using default value [{JPEG_QUALITY_DEFAULT}]", nesting_level=nesting_level+1)
-                else:
-                    try:
-                        jpeg_quality = int(jpeg_quality)
-                    except:
-                        warn(f"specified jpeg-quality [{jpeg_quality}] is not valid .. should be a number between 1-100 .. using default value [{JPEG_QUALITY_DEFAULT}]", nesting_level=nesting_level+1)
-                        jpeg_quality = JPEG_QUALITY_DEFAULT
-
-                jpegopt = {'quality': jpeg_quality, 'progressive': True, 'optimize': True}
-                all_images = pdf2image.convert_from_path(file_path, fmt='jpg', dpi=DPI, size=None, transparent=True, jpegopt=jpegopt, output_file=file_name, paths_only=True, output_folder=ConfigService()._temp_dir)
-                
-                images = []
-                if len(p_lists) == 0:
-                    images = all_images
-                    
+                jpeg_quality = section_jpeg_quality(section_data['section-prop']['jpeg-quality'], nesting_level=nesting_level+1)
+                dpi = section_dpi(section_data['section-prop']['dpi'], nesting_level=nesting_level+1)
+                page_format = section_page_format(section_data['section-prop']['page-format'], nesting_level=nesting_level+1)
+
+                # consider page-list, only the pages it selects are rasterized
+                page_count = pdf2image.pdfinfo_from_path(file_path)['Pages']
+                pages = page_list_to_pages(page_list=section_data['section-prop']['page-list'], page_count=page_count, nesting_level=nesting_level+1)
+                if page_format == 'pdf':
+                    # the pages are embedded as they are, the renderers need the page sizes, and the dpi for when they have to rasterize them
+                    if section_data['section-prop']['autocrop']:
+                        warn(f"autocrop is not applied to pages embedded with page-format [pdf]", nesting_level=nesting_level+1)
+
+                    page_sizes = pdf_page_sizes(file_path=file_path, page_count=page_count)
+                    images = [{'path': file_path, 'page': page + 1, 'format': 'pdf', 'size': page_sizes[page], 'dpi': dpi, 'autocrop': False} for page in pages]
+
                 else:
-                    for p_list in p_lists:
-                        try:
-                            if ':' not in p_list:
-                                images.append(all_images[int(p_list)])
-                            else:
-                                parts = p_list.split(':')
-                                sl = slice(*(int(p) if p else None for p in parts))
-                                images.extend(all_images[sl])          
-                        except:
-                            error(f"invalid page-list part [{parts}]", nesting_level=nesting_level+1)
-
-                # mark images for autocropping
-                images = [{'path': im_path, 'autocrop': section_data['section-prop']['autocrop']} for im_path in images]
+                    page_paths = render_pdf_pages(file_path=file_path, pages=pages, dpi=dpi, page_format=page_format, jpeg_quality=jpeg_quality, autocrop=section_data['section-prop']['autocrop'], nesting_level=nesting_level+1)
+
+                    # the pages are already autocropped (if asked) in the page cache
+                    images = [{'path': page_paths[page], 'autocrop': False, 'dpi': dpi} for page in pages if page in page_paths]
 
             except Exception as e:
-                print(e)
-                error(f".... could not convert {file_path} to image(s)", nesting_level=nesting_level)
+                error(f".... could not convert {file_path} to image(s): {e}", nesting_level=nesting_level)
 
         # if it is an image
         if file_type in IMAGE_MIME_TYPES:
             images = [{'path': file_path, 'autocrop': section_data['section-prop']['autocrop']}]
 
         data['images'] = []
+        # the images are cropped into copies, the downloaded image is the shared file in the asset store
+        cropped_images = autocrop_images(image_paths=[image['path'] for image in images if image['autocrop']], in_place=False, nesting_level=nesting_level+1)
         for image in images:
-            if image['autocrop']:
-                width, height, dpi_x, dpi_y = autocrop_image_pillow(image['path'], nesting_level=nesting_level+1)
-                # width, height, dpi_x, dpi_y = autocrop_image_opencv(image['path'], nesting_level=nesting_level+1)
+            # a pdf page embedded as it is, its size is in points
+            if image.get('format') == 'pdf':
+                width_in_points, height_in_points = image['size']
+                data['images'].append({'path': image['path'], 'page': image['page'], 'format': 'pdf', 'dpi': image['dpi'], 'width': width_in_points / 72, 'height': height_in_points / 72})
+                continue
+
+            if image['path'] in cropped_images:
+                image['path'], width, height, dpi_x, dpi_y = cropped_images[image['path']]
             else:
                 width, height, dpi_x, dpi_y = image_meta_pillow(image['path'], nesting_level=nesting_level+1)
 
+            # rasterized pages are sized by the dpi they were rasterized at
+            if 'dpi' in image:
+                dpi_x, dpi_y = image['dpi'], image['dpi']
+
             width_in_inches = width / dpi_x
             height_in_inches = height / dpi_y
 
@@ -115,11 +107,232 @@ def process(gsheet, section_data, worksheet_cache, gsheet_data, current_document
     return data
 
 
-''' crop the image automatically
-    TODO: looks like it does not work properly
+''' the jpeg quality the pages of a pdf section are rasterized with, JPEG_QUALITY_DEFAULT if the section does not specify a valid one
+'''
+def section_jpeg_quality(jpeg_quality, nesting_level=0):
+    if jpeg_quality is None or str(jpeg_quality).strip() == '':
+        # trace(f"jpeg-quality not specified explicitly .. using default value [{JPEG_QUALITY_DEFAULT}]", nesting_level=nesting_level)
+        return JPEG_QUALITY_DEFAULT
+
+    try:
+        return int(str(jpeg_quality).strip())
+
+    except:
+        warn(f"specified jpeg-quality [{jpeg_quality}] is not valid .. should be a number between 1-100 .. using default value [{JPEG_QUALITY_DEFAULT}]", nesting_level=nesting_level)
+        return JPEG_QUALITY_DEFAULT
+
+
+''' the pdf page rendering settings of a pdf section as they are resolved from the section properties and the configuration
+    the output of a pdf section depends on them, so they are part of its fingerprint in incremental mode
+'''
+def section_render_settings(section_prop, nesting_level=0):
+    return {
+        'dpi': section_dpi(section_prop['dpi'], nesting_level=nesting_level),
+        'page-format': section_page_format(section_prop['page-format'], nesting_level=nesting_level),
+        'jpeg-quality': section_jpeg_quality(section_prop['jpeg-quality'], nesting_level=nesting_level),
+    }
+
+
+''' the dpi the pages of a pdf section are rasterized at, the configured pdf-page-dpi if the section does not specify a valid one
+'''
+def section_dpi(dpi, nesting_level=0):
+    default_dpi = int(ConfigService()._pdf_page_dpi)
+    if dpi is None or str(dpi).strip() == '':
+        return default_dpi
+
+    try:
+        dpi = int(str(dpi).strip())
+        if dpi > 0:
+            return dpi
+
+    except:
+        pass
+
+    warn(f"specified dpi [{dpi}] is not valid .. should be a positive number .. using default value [{default_dpi}]", nesting_level=nesting_level)
+    return default_dpi
+
+
+''' how the pages of a pdf section are embedded - jpg or png (rasterized) or pdf (as they are), jpg if the section does not specify a valid one
+'''
+def section_page_format(page_format, nesting_level=0):
+    if page_format is None or str(page_format).strip() == '':
+        return PAGE_FORMATS[0]
+
+    page_format = str(page_format).strip().lower()
+    if page_format == 'jpeg':
+        return 'jpg'
+
+    if page_format in PAGE_FORMATS:
+        return page_format
+
+    warn(f"specified page-format [{page_format}] is not valid .. should be one of {PAGE_FORMATS} .. using default value [{PAGE_FORMATS[0]}]", nesting_level=nesting_level)
+    return PAGE_FORMATS[0]
+
+
+''' the pages (0-based, in page-list order, repeats allowed) that a page-list selects from a pdf of page_count pages
+    the page-list is a comma separated list of python style indexes and slices of the pages (3, -1, 3:5, :2, ::2), an empty page-list selects every page
+'''
+def page_list_to_pages(page_list, page_count, nesting_level=0):
+    all_pages = list(range(page_count))
+    if page_list is None or page_list.strip() == '':
+        return all_pages
+
+    pages = []
+    for p_list in page_list.replace(' ', '').split(','):
+        try:
+            if ':' not in p_list:
+                pages.append(all_pages[int(p_list)])
+            else:
+                parts = p_list.split(':')
+                sl = slice(*(int(p) if p else None for p in parts))
+                pages.extend(all_pages[sl])
+        except:
+            error(f"invalid page-list part [{p_list}]", nesting_level=nesting_level)
+
+    return pages
+
+
+''' the contiguous runs [first, last] of page numbers (1-based) that cover the given pages (0-based), no run longer than max_run_length pages
+'''
+def page_runs(pages, max_run_length=None):
+    runs = []
+    for page_number in sorted(set(page + 1 for page in pages)):
+        if runs and runs[-1][1] == page_number - 1 and (max_run_length is None or runs[-1][1] - runs[-1][0] + 1 < max_run_length):
+            runs[-1][1] = page_number
+        else:
+            runs.append([page_number, page_number])
+
+    return runs
+
+
+''' rasterize the given pages (0-based) of a pdf into jpg or png files, autocropped if asked, returns a dict of page -> image path
+    the images are kept in the page cache keyed by the pdf content, page, dpi, format, jpeg quality and autocrop (with its tolerance), so a pdf embedded again - in this or a later run, in any document - is not rasterized again
+    the pages that are not in the cache are split into runs of contiguous pages spread over pdf-render-thread-count workers, each running its own poppler process
+'''
+def render_pdf_pages(file_path, pages, dpi, page_format, jpeg_quality, autocrop, nesting_level=0):
+    config_service = ConfigService()
+    config_service._pdf_page_cache_dir.mkdir(parents=True, exist_ok=True)
+    pdf_hash = file_content_hash(file_path)
+
+    page_paths = {}
+    pages_to_render = []
+    for page in sorted(set(pages)):
+        page_path = page_cache_path(pdf_hash=pdf_hash, page=page, dpi=dpi, page_format=page_format, jpeg_quality=jpeg_quality, autocrop=autocrop)
+        if config_service._pdf_page_cache and page_path.exists():
+            page_paths[page] = str(page_path)
+        else:
+            pages_to_render.append(page)
+
+    trace(f"[{len(page_paths)}] pages of [{file_path}] found in the page cache, [{len(pages_to_render)}] pages to rasterize at [{dpi}] dpi", nesting_level=nesting_level)
+    if not pages_to_render:
+        return page_paths
+
+    worker_count = min(int(config_service._pdf_render_thread_count) or os.cpu_count() or 1, len(pages_to_render))
+    runs = page_runs(pages_to_render, max_run_length=math.ceil(len(pages_to_render) / worker_count))
+    jpegopt = {'quality': jpeg_quality, 'progressive': True, 'optimize': True} if page_format == 'jpg' else None
+    with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='pdf-render') as pool:
+        futures = [pool.submit(render_page_run, file_path=file_path, first_page=first_page, last_page=last_page, dpi=dpi, page_format=page_format, jpegopt=jpegopt, nesting_level=nesting_level) for first_page, last_page in runs]
+        rendered_paths = {}
+        for future in futures:
+            rendered_paths.update(future.result())
+
+    # the rendered pages are files of this run only, they are cropped in place
+    if autocrop:
+        autocrop_images(image_paths=rendered_paths.values(), in_place=True, nesting_level=nesting_level)
+
+    for page, rendered_path in rendered_paths.items():
+        page_path = page_cache_path(pdf_hash=pdf_hash, page=page, dpi=dpi, page_format=page_format, jpeg_quality=jpeg_quality, autocrop=autocrop)
+        os.replace(rendered_path, page_path)
+        page_paths[page] = str(page_path)
+
+    return page_paths
+
+
+''' rasterize a run of pages [first_page, last_page] (1-based) of a pdf into jpg or png files in the temp dir, returns a dict of page (0-based) -> image path
+'''
+def render_page_run(file_path, first_page, last_page, dpi, page_format, jpegopt, nesting_level=0):
+    import pdf2image
+
+    trace(f"rasterizing pages [{first_page}-{last_page}] of [{file_path}]", nesting_level=nesting_level)
+    # every run has its own file name prefix, the files are named {prefix}0001-{page number}.{page_format}
+    output_file = f"pages-{os.getpid()}-{threading.get_ident()}-{first_page}-{last_page}-"
+    run_paths = pdf2image.convert_from_path(file_path, fmt=page_format, dpi=dpi, size=None, transparent=True, jpegopt=jpegopt, first_page=first_page, last_page=last_page, output_file=output_file, paths_only=True, output_folder=ConfigService()._temp_dir)
+
+    page_paths = {}
+    for run_path in run_paths:
+        page_number = int(Path(run_path).stem.rsplit('-', 1)[-1])
+        if first_page <= page_number <= last_page:
+            page_paths[page_number - 1] = run_path
+
+    return page_paths
+
+
+''' the path of a page image in the page cache, the jpeg quality is part of the key of jpg pages only, the autocrop tolerance of autocropped pages only
+'''
+def page_cache_path(pdf_hash, page, dpi, page_format, jpeg_quality, autocrop):
+    quality = jpeg_quality if page_format == 'jpg' else 'lossless'
+    crop = f"autocrop{ConfigService()._autocrop_tolerance}" if autocrop else 'full'
+    return ConfigService()._pdf_page_cache_dir / f"{pdf_hash}-{page + 1}-{dpi}-{quality}-{crop}.{page_format}"
+
+
+''' the sizes (width, height) in points of the pages (0-based) of a pdf as they are displayed, that is with the page rotation applied
+'''
+def pdf_page_sizes(file_path, page_count):
+    import pdf2image
+
+    pdf_info = pdf2image.pdfinfo_from_path(file_path, first_page=1, last_page=page_count)
+    page_sizes = {}
+    page_rotations = {}
+    for key, value in pdf_info.items():
+        key_match = re.match(r'^Page\s+(\d+)\s+(size|rot)$', key.strip())
+        if key_match is None:
+            continue
+
+        page = int(key_match.group(1)) - 1
+        if key_match.group(2) == 'rot':
+            page_rotations[page] = int(float(value))
+
+        else:
+            size_match = re.match(r'^([\d.]+)\s*x\s*([\d.]+)', value)
+            if size_match is not None:
+                page_sizes[page] = (float(size_match.group(1)), float(size_match.group(2)))
+
+    for page, (width, height) in page_sizes.items():
+        if page_rotations.get(page, 0) % 180 == 90:
+            page_sizes[page] = (height, width)
+
+    return page_sizes
+
+
+''' autocrop images in parallel, in place or into copies in the autocrop dir, returns a dict of image path -> (cropped image path, width, height, dpi_x, dpi_y)
 '''
-def autocrop_image_pillow(im_path, nesting_level):
-    im = Image.open(im_path)
+def autocrop_images(image_paths, in_place, nesting_level=0):
+    image_paths = list(dict.fromkeys(image_paths))
+    if not image_paths:
+        return {}
+
+    worker_count = min(int(ConfigService()._autocrop_thread_count) or os.cpu_count() or 1, len(image_paths))
+    with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='autocrop') as pool:
+        cropped_images = dict(zip(image_paths, pool.map(lambda image_path: autocrop_image(image_path, in_place=in_place, nesting_level=nesting_level), image_paths)))
+
+    save_crop_boxes(nesting_level=nesting_level)
+
+    return cropped_images
+
+
+''' crop the image automatically to the content, the part that differs from the background by more than the autocrop tolerance
+    the crop box of an image is cached by the hash of the image and the tolerance, the image is not re-encoded when there is nothing to crop
+    the cropped image replaces the image if in_place, else it is written to the autocrop dir keyed by the image hash and the tolerance, returns (cropped image path, width, height, dpi_x, dpi_y)
+'''
+def autocrop_image(im_path, in_place, nesting_level=0):
+    from PIL import Image
+
+    tolerance = ConfigService()._autocrop_tolerance
+
+    with open(im_path, 'rb') as f:
+        image_bytes = f.read()
+
+    im = Image.open(io.BytesIO(image_bytes))
     min_width_height = 2
     width, height = im.size
 
@@ -128,60 +341,121 @@ def autocrop_image_pillow(im_path, nesting_level):
     else:
         dpi_x, dpi_y = DPI, DPI
 
-    # trace(f"original image size [{width}x{height}]", nesting_level=nesting_level)
-    bg = Image.new(im.mode, im.size, im.getpixel((0,0)))
-    diff = ImageChops.difference(im, bg)
-    diff = ImageChops.add(diff, diff, 2.0, 0)
-    # Bounding box given as a 4-tuple defining the left, upper, right, and lower pixel coordinates. If the image is completely empty, this method returns None.
-    bbox = diff.getbbox()
-    if bbox:
-        cropped = im.crop(bbox)
-        if cropped.size[1] < min_width_height or cropped.size[0] < min_width_height:
-            # trace(f"cropped image width/height [{cropped.size[0]}x{cropped.size[1]}] is less than {(min_width_height)}, will use the original image", nesting_level=nesting_level)
-            pass
-        else:
-            width, height = cropped.size
-            # trace(f"cropped image: size [{width}x{height}]", nesting_level=nesting_level)
-            cropped.save(im_path, dpi=(dpi_x, dpi_y))
-            # cropped.save(im_path)
+    image_hash = hashlib.sha1(image_bytes).hexdigest()
+    crop_boxes = load_crop_boxes(nesting_level=nesting_level)
+    with CROP_BOXES_LOCK:
+        crop_box = crop_boxes.get(f"{image_hash}-{tolerance}")
+
+    if crop_box is None:
+        crop_box = image_crop_box(im, tolerance=tolerance)
+        with CROP_BOXES_LOCK:
+            crop_boxes[f"{image_hash}-{tolerance}"] = crop_box
+
+    # an empty image, an image without any margin to crop or a box too small to be useful leaves the image as it is
+    if not crop_box or list(crop_box) == [0, 0, width, height]:
+        return im_path, width, height, dpi_x, dpi_y
+
+    if crop_box[2] - crop_box[0] < min_width_height or crop_box[3] - crop_box[1] < min_width_height:
+        # trace(f"cropped image width/height is less than {(min_width_height)}, will use the original image", nesting_level=nesting_level)
+        return im_path, width, height, dpi_x, dpi_y
+
+    width, height = crop_box[2] - crop_box[0], crop_box[3] - crop_box[1]
+    if in_place:
+        cropped_path = Path(im_path)
 
-    return width, height, dpi_x, dpi_y
+    else:
+        cropped_path = ConfigService()._autocrop_dir / f"{image_hash[:24]}-{tolerance}{Path(im_path).suffix.lower()}"
+        if cropped_path.exists():
+            return str(cropped_path), width, height, dpi_x, dpi_y
+
+    cropped = im.crop(tuple(crop_box))
+    cropped_bytes = io.BytesIO()
+    cropped.save(cropped_bytes, format=im.format, dpi=(dpi_x, dpi_y))
+
+    # written atomically, a copy in the autocrop dir may be read by another process at the same time
+    cropped_path.parent.mkdir(parents=True, exist_ok=True)
+    cropped_tmp_path = cropped_path.with_name(f"{cropped_path.stem}.{os.getpid()}-{threading.get_ident()}{cropped_path.suffix}")
+    with open(cropped_tmp_path, 'wb') as f:
+        f.write(cropped_bytes.getvalue())
+
+    os.replace(cropped_tmp_path, cropped_path)
 
+    # the cropped image has nothing more to crop
+    with CROP_BOXES_LOCK:
+        crop_boxes[f"{hashlib.sha1(cropped_bytes.getvalue()).hexdigest()}-{tolerance}"] = [0, 0, width, height]
 
-''' crop the image automatically
-    TODO: looks like it works better than the pillow version
+    # trace(f"cropped image: size [{width}x{height}]", nesting_level=nesting_level)
+    return str(cropped_path), width, height, dpi_x, dpi_y
+
+
+''' the box [left, upper, right, lower] of the pixels differing from the background by more than tolerance (0-255) in any channel, [] if there are none
+    the background is the median color of the image border, the box is found with row/column reductions of the difference mask
 '''
-def autocrop_image_opencv(im_path, nesting_level):
-    im = cv2.imread(im_path)
-    min_width_height = 2
-    height, width, _ = im.shape
-    dpi_x, dpi_y = DPI, DPI
-    trace(f"original image size [{width}x{height}]", nesting_level=nesting_level)
-
-    gray = cv2.cvtColor(im, cv2.COLOR_BGR2GRAY)
-
-    # Threshold or Canny edge detection to find the subject
-    _, thresh = cv2.threshold(gray, 100, 255, cv2.THRESH_BINARY_INV)
-    # _, thresh = cv2.threshold(gray, 10, 255, cv2.THRESH_BINARY)
-    
-    # Find contours
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    if contours:
-        # Find the largest contour by area
-        # c = max(contours, key=cv2.contourArea)
-        # x, y, w, h = cv2.boundingRect(c)
-
-        # Combine all contours into one bounding box
-        x, y, w, h = cv2.boundingRect(np.vstack(contours))
-        
-        # Crop the image based on the bounding box
-        if h < min_width_height or w < min_width_height:
-            trace(f"cropped image width/height [{w}x{h}] is less than {(min_width_height)}, will use the original image", nesting_level=nesting_level)
-        else:
-            cropped = im[y:y+h, x:x+w]
-            height, width, _ = cropped.shape
-            cv2.imwrite(im_path, cropped)
-            trace(f"cropped image: size [{w}x{h}]", nesting_level=nesting_level)
+def image_crop_box(im, tolerance):
+    import numpy as np
+
+    if im.mode not in ['L', 'RGB', 'RGBA']:
+        im = im.convert('RGBA' if 'A' in im.getbands() or 'transparency' in im.info else 'RGB')
+
+    pixels = np.asarray(im)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, np.newaxis]
+
+    border = np.concatenate([pixels[0, :], pixels[-1, :], pixels[:, 0], pixels[:, -1]])
+    background = np.median(border, axis=0)
+
+    content = (np.abs(pixels.astype(np.int16) - background.astype(np.int16)) > tolerance).any(axis=2)
+    rows = np.flatnonzero(content.any(axis=1))
+    if rows.size == 0:
+        return []
+
+    columns = np.flatnonzero(content.any(axis=0))
+    return [int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1]
+
+
+''' the crop boxes keyed by image hash and autocrop tolerance ({hash}-{tolerance}), loaded from the temp dir on first use
+'''
+def load_crop_boxes(nesting_level=0):
+    global CROP_BOXES
+    with CROP_BOXES_LOCK:
+        if CROP_BOXES is None:
+            CROP_BOXES = {}
+            crop_boxes_path = ConfigService()._temp_dir / 'crop-boxes.json'
+            if crop_boxes_path.exists():
+                try:
+                    with open(crop_boxes_path, 'r', encoding='utf-8') as f:
+                        CROP_BOXES = json.load(f)
+
+                except Exception as e:
+                    warn(f"crop boxes could not be read: {e}", nesting_level=nesting_level)
+
+        return CROP_BOXES
+
+
+''' write the crop boxes atomically
+'''
+def save_crop_boxes(nesting_level=0):
+    crop_boxes_path = ConfigService()._temp_dir / 'crop-boxes.json'
+    crop_boxes_tmp_path = crop_boxes_path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+    with CROP_BOXES_LOCK:
+        if CROP_BOXES is None:
+            return
+
+        try:
+            with open(crop_boxes_tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(CROP_BOXES, f)
+
+            os.replace(crop_boxes_tmp_path, crop_boxes_path)
+
+        except Exception as e:
+            warn(f"crop boxes could not be written: {e}", nesting_level=nesting_level)
+
+
+
+# the ways pdf pages can be embedded, the first one is the default
+PAGE_FORMATS = ['jpg', 'png', 'pdf']
+
 
-    return width, height, DPI, DPI
+# autocrop boxes keyed by image hash and autocrop tolerance, loaded on first use
+CROP_BOXES = None
+CROP_BOXES_LOCK = threading.Lock()
@@ -4,9 +4,11 @@
 
 import re
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 from ggle.google_services import GoogleServices
 from helper.config_service import ConfigService
+from helper.asset_store import AssetStore
 from helper.logger import *
 from helper.util import *
 
@@ -14,8 +16,9 @@ from helper.util import *
 def process(gsheet, section_data, worksheet_cache, gsheet_data, current_document_index, nesting_level=0):
     ws_title = section_data['section-prop']['link']
 
-    # if the worksheet has already been read earlier, use the content from cache
+    # if the worksheet has already been read earlier, use the content from cache, the assets it used are used again
     if ws_title in worksheet_cache[gsheet.title]:
+        AssetStore().record_assets(WORKSHEET_ASSETS.get((gsheet.title, ws_title), {}))
         return worksheet_cache[gsheet.title][ws_title]
 
     info(f"processing ... [{gsheet.title}] : [{ws_title}]", nesting_level=nesting_level)
@@ -27,6 +30,26 @@ def process(gsheet, section_data, worksheet_cache, gsheet_data, current_document
         warn(f"worksheet [{ws_title}] not found", nesting_level=nesting_level)
         return {}
 
+    # the assets the worksheet uses are collected, they are recorded again whenever it is taken from the worksheet cache
+    AssetStore().start_collecting()
+    try:
+        process_cells(worksheet_data=worksheet_data, gsheet=gsheet, section_data=section_data, worksheet_cache=worksheet_cache, gsheet_data=gsheet_data, current_document_index=current_document_index, nesting_level=nesting_level)
+
+    finally:
+        assets = AssetStore().stop_collecting()
+
+    worksheet_cache[gsheet.title][ws_title] = worksheet_data
+    WORKSHEET_ASSETS[(gsheet.title, ws_title)] = assets
+
+    return worksheet_data
+
+
+''' process the notes and formulas of the cells of a worksheet, the downloads they need are patched into the cells
+'''
+def process_cells(worksheet_data, gsheet, section_data, worksheet_cache, gsheet_data, current_document_index, nesting_level=0):
+    # downloads are queued while walking the cells and the results are patched back into the cells once all are queued
+    pending_downloads = []
+
     # if any of the cells have userEnteredValue of IMAGE or HYPERLINK or Range Formula, process it
     row = 2
     # start at row 3
@@ -40,7 +63,7 @@ def process(gsheet, section_data, worksheet_cache, gsheet_data, current_document
                     note_json = cell_data['note']
                     tmp_dir = ConfigService()._temp_dir
 
-                    process_note(note_json=note_json, cell_data=cell_data, row=row, val=val, tmp_dir=tmp_dir, nesting_level=nesting_level)
+                    process_note(note_json=note_json, cell_data=cell_data, row=row, val=val, tmp_dir=tmp_dir, pending_downloads=pending_downloads, nesting_level=nesting_level)
 
                 if 'userEnteredValue' in cell_data:
                     user_entered_value = cell_data['userEnteredValue']
@@ -51,7 +74,7 @@ def process(gsheet, section_data, worksheet_cache, gsheet_data, current_document
                         row_height = worksheet_data['data'][0]['rowMetadata'][row]['pixelSize']
                         tmp_dir = ConfigService()._temp_dir
 
-                        process_formula(formula_value=formula_value, cell_data=cell_data, row=row, val=val, row_height=row_height, tmp_dir=tmp_dir, worksheet_data=worksheet_data, gsheet=gsheet, section_data=section_data, worksheet_cache=worksheet_cache, gsheet_data=gsheet_data, current_document_index=current_document_index, nesting_level=nesting_level)
+                        process_formula(formula_value=formula_value, cell_data=cell_data, row=row, val=val, row_height=row_height, tmp_dir=tmp_dir, worksheet_data=worksheet_data, gsheet=gsheet, section_data=section_data, worksheet_cache=worksheet_cache, gsheet_data=gsheet_data, current_document_index=current_document_index, pending_downloads=pending_downloads, nesting_level=nesting_level)
 
                     else:
                         # TODO: 
@@ -62,14 +85,71 @@ def process(gsheet, section_data, worksheet_cache, gsheet_data, current_document
 
         row = row + 1
 
-    worksheet_cache[gsheet.title][ws_title] = worksheet_data
+    # wait for the downloads and patch the results into the cells
+    resolve_downloads(pending_downloads=pending_downloads, nesting_level=nesting_level)
 
-    return worksheet_data
+
+# the shared downloader pool and the downloads queued so far, an asset is downloaded only once per top-level document
+# the assets used by the worksheets processed so far, a worksheet taken from the worksheet cache uses them again
+DOWNLOAD_POOL = None
+DOWNLOADS = {}
+WORKSHEET_ASSETS = {}
+
+''' queue a download in the downloader pool, on_done is called with the download result when the download is resolved
+    the download also returns the assets it used, they are recorded in the section thread each time the download is resolved
+'''
+def queue_download(key, download_function, pending_downloads, on_done, nesting_level=0):
+    global DOWNLOAD_POOL
+    if DOWNLOAD_POOL is None:
+        DOWNLOAD_POOL = ThreadPoolExecutor(max_workers=max(ConfigService()._asset_download_thread_count, 1), thread_name_prefix='asset-download')
+
+    def collecting_download_function():
+        AssetStore().start_collecting()
+        try:
+            result = download_function()
+
+        finally:
+            assets = AssetStore().stop_collecting()
+
+        return result, assets
+
+    if key not in DOWNLOADS:
+        DOWNLOADS[key] = DOWNLOAD_POOL.submit(collecting_download_function)
+
+    pending_downloads.append((key, DOWNLOADS[key], on_done))
+
+
+''' wait for the queued downloads in the order they were queued and hand the results over
+    a failed download is forgotten, so that it is tried again when it is queued again
+'''
+def resolve_downloads(pending_downloads, nesting_level=0):
+    for key, future, on_done in pending_downloads:
+        try:
+            result, assets = future.result()
+            AssetStore().record_assets(assets)
+
+        except Exception as e:
+            warn(f"download failed: {e}", nesting_level=nesting_level)
+            if DOWNLOADS.get(key) is future:
+                del DOWNLOADS[key]
+
+            result = None
+
+        on_done(result)
+
+    pending_downloads.clear()
+
+
+''' forget the downloads of the document just written, the assets stay in the asset store
+'''
+def release_downloads():
+    DOWNLOADS.clear()
+    WORKSHEET_ASSETS.clear()
 
 
 ''' parse note
 '''
-def process_note(note_json, cell_data, row, val, tmp_dir, nesting_level=0):
+def process_note(note_json, cell_data, row, val, tmp_dir, pending_downloads, nesting_level=0):
     try:
         note_dict = json.loads(note_json, strict=False)
 
@@ -101,46 +181,71 @@ def process_note(note_json, cell_data, row, val, tmp_dir, nesting_level=0):
         for ii_dict in inline_image_list:
             if 'url' in ii_dict:
                 url = ii_dict.get('url')
-                
+
                 # download image
                 debug(f"[{row}]: downloading inline image {url}", nesting_level=nesting_level+1)
-                ii_image_dict = download_image(drive_service=GoogleServices().drive_api, url=url, title=None, tmp_dir=tmp_dir, nesting_level=nesting_level+1)
+                download_function = lambda url=url: download_image(drive_service=GoogleServices().drive_api, url=url, title=None, tmp_dir=tmp_dir, nesting_level=nesting_level+1)
+                on_done = lambda result, ii_dict=ii_dict: add_inline_image(cell_data=cell_data, ii_dict=ii_dict, ii_image_dict=result, row=row, nesting_level=nesting_level)
+                queue_download(key=('image', url), download_function=download_function, pending_downloads=pending_downloads, on_done=on_done, nesting_level=nesting_level)
 
-                # type background/inline
-                ii_image_dict['type'] = ii_dict.get('type', 'background')
 
-                # fit-height-to-container true/false,
-                ii_image_dict['fit-height-to-container'] = ii_dict.get('fit-height-to-container', False)
+''' add a downloaded inline image to the cell
+'''
+def add_inline_image(cell_data, ii_dict, ii_image_dict, row, nesting_level=0):
+    if ii_image_dict is None:
+        warn(f"[{row}]: inline image {ii_dict.get('url')} could not be downloaded", nesting_level=nesting_level+1)
+        return
+
+    # the same image may be used in many cells
+    ii_image_dict = dict(ii_image_dict)
+
+    # type background/inline
+    ii_image_dict['type'] = ii_dict.get('type', 'background')
+
+    # fit-height-to-container true/false,
+    ii_image_dict['fit-height-to-container'] = ii_dict.get('fit-height-to-container', False)
 
-                # fit-width-to-container true/false,
-                ii_image_dict['fit-width-to-container'] = ii_dict.get('fit-width-to-container', False)
+    # fit-width-to-container true/false,
+    ii_image_dict['fit-width-to-container'] = ii_dict.get('fit-width-to-container', False)
 
-                # fit-height-to-container true/false,
-                ii_image_dict['keep-aspect-ratio'] = ii_dict.get('keep-aspect-ratio', True)
+    # fit-height-to-container true/false,
+    ii_image_dict['keep-aspect-ratio'] = ii_dict.get('keep-aspect-ratio', True)
 
-                # extend-container-height true/false,
-                ii_image_dict['extend-container-height'] = ii_dict.get('extend-container-height', False)
+    # extend-container-height true/false,
+    ii_image_dict['extend-container-height'] = ii_dict.get('extend-container-height', False)
 
-                # position is horizontal and vertical positions [center/left/right] [middle/top/bottom]
-                ii_image_dict['position'] = ii_dict.get('position', 'center middle')
+    # position is horizontal and vertical positions [center/left/right] [middle/top/bottom]
+    ii_image_dict['position'] = ii_dict.get('position', 'center middle')
 
-                # wrap none/parallel
-                ii_image_dict['wrap'] = ii_dict.get('wrap', 'parallel')
+    # wrap none/parallel
+    ii_image_dict['wrap'] = ii_dict.get('wrap', 'parallel')
 
-                cell_data['inline-image'].append(ii_image_dict)
-                # trace(f"downloaded  inline image {url}", nesting_level=nesting_level+1)
+    cell_data['inline-image'].append(ii_image_dict)
+    # trace(f"downloaded  inline image {url}", nesting_level=nesting_level+1)
 
 
 ''' parse formula
 '''
-def process_formula(formula_value, cell_data, row, val, row_height, tmp_dir, worksheet_data, gsheet, section_data, worksheet_cache, gsheet_data, current_document_index, nesting_level):
+def process_formula(formula_value, cell_data, row, val, row_height, tmp_dir, worksheet_data, gsheet, section_data, worksheet_cache, gsheet_data, current_document_index, pending_downloads, nesting_level):
     # content can be an IMAGE/image with an image formula like "=image(....)"
     m = re.match(r'=IMAGE\((?P<name>.+)\)', formula_value, re.IGNORECASE)
     if m and m.group('name') is not None:
-        result = download_image_from_formula(m.group('name'), tmp_dir, row_height, nesting_level=nesting_level+1)
-        if result:
-            worksheet_data['data'][0]['rowData'][row]['values'][val]['userEnteredValue']['image'] = result
-            cell_data['image'] = result
+        image_formula = m.group('name')
+        url, file_ext = image_url_from_formula(image_formula=image_formula, nesting_level=nesting_level+1)
+        if url is None:
+            return
+
+        def on_done(local_path):
+            if not local_path:
+                return
+
+            result = image_from_formula(image_formula=image_formula, url=url, local_path=local_path, row_height=row_height, nesting_level=nesting_level+1)
+            if result:
+                worksheet_data['data'][0]['rowData'][row]['values'][val]['userEnteredValue']['image'] = result
+                cell_data['image'] = result
+
+        download_function = lambda: download_image_from_url(url=url, file_ext=file_ext, nesting_level=nesting_level+1)
+        queue_download(key=('url', url), download_function=download_function, pending_downloads=pending_downloads, on_done=on_done, nesting_level=nesting_level)
 
         return
 
@@ -161,22 +266,28 @@ def process_formula(formula_value, cell_data, row, val, row_height, tmp_dir, wor
         # this may be a drive file
         if url.startswith('https://drive.google.com/'):
             info(f"processing drive file ... [{title}] : [{url}]", nesting_level=nesting_level)
-            data = download_file_from_drive(drive_service=GoogleServices().drive_api, url=url, title=title, tmp_dir=ConfigService()._temp_dir, nesting_level=nesting_level+1)
-            # if it is an image
-            if data['file-type'].startswith('image/'):
-                # TODO: we are hardcoding shape, dpi and other parameters for images
-                image_params = image_params_from_image(local_path=data['file-path'], row_height=row_height, mode=1, formula=formula_value, formula_parts=[], nesting_level=nesting_level+1)
-                if image_params:
-                    result =  {**{'url': url, 'path': data['file-path'], 'mode': 1}, **image_params}
-                    worksheet_data['data'][0]['rowData'][row]['values'][val]['userEnteredValue']['image'] = result
-                    cell_data['image'] = result
 
+            def on_done(data):
+                # if it is an image
+                if data and data['file-type'].startswith('image/'):
+                    # TODO: we are hardcoding shape, dpi and other parameters for images
+                    image_params = image_params_from_image(local_path=data['file-path'], row_height=row_height, mode=1, formula=formula_value, formula_parts=[], nesting_level=nesting_level+1)
+                    if image_params:
+                        result =  {**{'url': url, 'path': data['file-path'], 'mode': 1}, **image_params}
+                        worksheet_data['data'][0]['rowData'][row]['values'][val]['userEnteredValue']['image'] = result
+                        cell_data['image'] = result
+
+            download_function = lambda: download_file_from_drive(drive_service=GoogleServices().drive_api, url=url, title=title, tmp_dir=ConfigService()._temp_dir, nesting_level=nesting_level+1)
+            queue_download(key=('drive', url, title), download_function=download_function, pending_downloads=pending_downloads, on_done=on_done, nesting_level=nesting_level)
 
 
         # or it may be a web url
         elif url.startswith('http'):
-            text = read_web_content(url, nesting_level=nesting_level+1)
-            if text is not None: cell_data['formattedValue'] = text
+            def on_done(text):
+                if text is not None: cell_data['formattedValue'] = text
+
+            download_function = lambda: read_web_content(url, nesting_level=nesting_level+1)
+            queue_download(key=('web', url), download_function=download_function, pending_downloads=pending_downloads, on_done=on_done, nesting_level=nesting_level)
 
         return
 
@@ -192,6 +303,6 @@ def process_formula(formula_value, cell_data, row, val, row_height, tmp_dir, wor
             trace(f"formula [{formula_value}] is a link to range [{ws_name}]![{range}]", nesting_level=nesting_level)
             response = get_gsheet_data(sheets_service=GoogleServices().sheets_api, spreadsheet_id=gsheet.id, ranges=[f"'{ws_name}'!{range}"])
             range_formula_value = response['sheets'][0]['data'][0]['rowData'][0]['values'][0]['userEnteredValue']['formulaValue']
-            process_formula(formula_value=range_formula_value, cell_data=cell_data, row=row, val=val, row_height=row_height, tmp_dir=tmp_dir, worksheet_data=worksheet_data, gsheet=gsheet, section_data=section_data, current_document_index=current_document_index, nesting_level=nesting_level)
+            process_formula(formula_value=range_formula_value, cell_data=cell_data, row=row, val=val, row_height=row_height, tmp_dir=tmp_dir, worksheet_data=worksheet_data, gsheet=gsheet, section_data=section_data, worksheet_cache=worksheet_cache, gsheet_data=gsheet_data, current_document_index=current_document_index, pending_downloads=pending_downloads, nesting_level=nesting_level)
 
     return
@@ -11,6 +11,8 @@ from pathlib import Path
 
 from context.context_helper import ContextHelper
 from context.context_util import *
+from helper.image_downscaler import set_image_downscaling
+from helper.interchange import document_path, read_document, set_format_table
 from helper.logger import *
 from helper import logger
 
@@ -27,7 +29,7 @@ class ContextFromJson(object):
         self.set_up()
         # process jsons one by one
         for json in self._CONFIG['jsons']:
-            self._CONFIG['files']['input-json'] = f"{self._CONFIG['dirs']['output-dir']}/{json}.json"
+            self._CONFIG['files']['input-json'] = document_path(output_dir=self._CONFIG['dirs']['output-dir'], name=json, interchange_format=self._CONFIG.get('interchange-format', 'json'))
             self.load_json()
 
             # context-helper
@@ -58,14 +60,17 @@ class ContextFromJson(object):
 
         self._CONFIG['dirs']['temp-dir'] = str(self._CONFIG['dirs']['temp-dir']).replace('\\', '/')
 
+        # images are resampled to the size they are displayed at into the temp dir
+        set_image_downscaling(images_dir=Path(self._CONFIG['dirs']['temp-dir']) / 'images', target_dpi=self._CONFIG.get('image-target-dpi', 200), jpeg_quality=self._CONFIG.get('image-jpeg-quality', 85))
+
         self._CONFIG['files']['document-header'] = config_dir / self._CONFIG['files']['document-header']
 
         if not 'files' in self._CONFIG:
             self._CONFIG['files'] = {}
 
     def load_json(self):
-        with open(self._CONFIG['files']['input-json'], "r") as f:
-            self._data = json.load(f)
+        self._data = read_document(self._CONFIG['files']['input-json'])
+        set_format_table(self._data.get('formats'))
 
     def tear_down(self):
         self.end_time = int(round(time.time() * 1000))
@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 
+import copy
 import json
 import importlib
 import inspect
 from pprint import pprint
  
 from context.context_util import *
+from helper.image_downscaler import downscaled_image_path
+from helper.interchange import parsed_format
 from helper.logger import *
 
 #   ----------------------------------------------------------------------------------------------------------------
@@ -300,7 +303,8 @@ class ContextPdfSection(ContextSectionBase):
 
                     # adjust image as per section width/height
                     image_width_in_inches, image_height_in_inches = fit_width_height(fit_within_width=self.section_width, fit_within_height=self.section_height, width_to_fit=image['width'], height_to_fit=image['height'])
-                    image_options = context_option(width=f"{image_width_in_inches}in", height=f"{image_height_in_inches}in")
+                    # a pdf page embedded as it is, the page is picked out of the pdf
+                    image_options = context_option(page=image.get('page') if image.get('format') == 'pdf' else None, width=f"{image_width_in_inches}in", height=f"{image_height_in_inches}in")
                     context_code = f"\\externalfigure[{os_specific_path(image['path'])}]{image_options}"
 
                     image_lines.append(context_code)
@@ -1132,14 +1136,15 @@ class Cell(object):
             self.note = CellNote(note_json=value.get('note'))
             self.formatted_value = self.value.get('formattedValue', '')
 
-            self.effective_format = CellFormat(format_dict=self.value.get('effectiveFormat'))
+            # formats are parsed once per entry of the document format table and copied for the cell
+            self.effective_format = parsed_format(self.value.get('effectiveFormat'), lambda effective_format_dict: CellFormat(format_dict=effective_format_dict)).copy()
 
             for text_format_run in self.value.get('textFormatRuns', []):
                 self.text_format_runs.append(TextFormatRun(run_dict=text_format_run, default_format=self.effective_format.text_format.source))
 
             # presence of userEnteredFormat makes the cell non-empty
             if 'userEnteredFormat' in self.value:
-                self.user_entered_format = CellFormat(format_dict=self.value.get('userEnteredFormat'))
+                self.user_entered_format = parsed_format(self.value.get('userEnteredFormat'), lambda user_entered_format_dict: CellFormat(format_dict=user_entered_format_dict)).copy()
                 self.is_empty = False
             else:
                 self.user_entered_format = None
@@ -1657,7 +1662,9 @@ class ImageValue(CellValue):
             pass
 
         image_options = context_option(width=f"{image_width_in_inches}in", height=f"{image_height_in_inches}in")
-        context_code = f"\\externalfigure[{os_specific_path(self.value['path'])}]{image_options}"
+        # the image is embedded no larger than it is displayed
+        image_path = downscaled_image_path(image_path=self.value['path'], width_in_inches=image_width_in_inches, height_in_inches=image_height_in_inches)
+        context_code = f"\\externalfigure[{os_specific_path(image_path)}]{image_options}"
 
         # image horizontal alignment
         image_halign = self.effective_format.halign.image_halign()
@@ -1724,6 +1731,14 @@ class CellFormat(object):
             self.text_format = None
 
 
+    ''' a copy of a (shared) parsed format for a cell, the borders are copied too as the border overrides modify them
+    '''
+    def copy(self):
+        cell_format = copy.copy(self)
+        cell_format.borders = copy.deepcopy(self.borders)
+        return cell_format
+
+
     ''' override borders with the specified color
     '''
     def override_borders(self, color):
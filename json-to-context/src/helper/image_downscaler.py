@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+'''
+images of IMAGE formulas and inline-image notes are resampled to the size they are displayed at (in pixels at image-target-dpi) before they go into the output
+a resampled image is kept in output-dir/tmp/images keyed by the content of the source image, the target size and the jpeg quality, so it is resampled only once
+this module is repeated in every json-to-* package
+'''
+
+import os
+import math
+import threading
+from pathlib import Path
+
+from helper.file_hash import file_content_hash
+from helper.logger import *
+
+''' the directory the resampled images are kept in, the resolution images are resampled for (0 turns resampling off) and the quality jpeg/webp images are recompressed with
+'''
+def set_image_downscaling(images_dir, target_dpi, jpeg_quality):
+    IMAGE_DOWNSCALING['images-dir'] = Path(images_dir)
+    IMAGE_DOWNSCALING['target-dpi'] = float(target_dpi or 0)
+    IMAGE_DOWNSCALING['jpeg-quality'] = int(jpeg_quality)
+
+
+''' the path of the image to embed for an image displayed at width x height inches
+    that is the source image itself if it is not larger than needed (or can not be resampled), otherwise a resampled copy of it
+'''
+def downscaled_image_path(image_path, width_in_inches, height_in_inches, nesting_level=0):
+    target_dpi = IMAGE_DOWNSCALING['target-dpi']
+    if not target_dpi or IMAGE_DOWNSCALING['images-dir'] is None or image_path is None or not width_in_inches or not height_in_inches:
+        return image_path
+
+    from PIL import Image
+
+    try:
+        with Image.open(image_path) as im:
+            if im.format not in DOWNSCALABLE_FORMATS or getattr(im, 'n_frames', 1) > 1:
+                return image_path
+
+            # the aspect ratio is kept, the scale satisfies the more demanding of the two dimensions
+            width, height = im.size
+            scale = max(width_in_inches * target_dpi / width, height_in_inches * target_dpi / height)
+            if scale > DOWNSCALE_THRESHOLD:
+                return image_path
+
+            target_size = (max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale)))
+            quality = IMAGE_DOWNSCALING['jpeg-quality'] if im.format in ['JPEG', 'WEBP'] else 'lossless'
+            downscaled_path = IMAGE_DOWNSCALING['images-dir'] / f"{file_content_hash(image_path)}-{target_size[0]}x{target_size[1]}-{quality}{Path(image_path).suffix.lower()}"
+            if downscaled_path.exists():
+                return str(downscaled_path)
+
+            trace(f"resampling [{image_path}] from [{width}x{height}] to [{target_size[0]}x{target_size[1]}]", nesting_level=nesting_level)
+            downscaled_path.parent.mkdir(parents=True, exist_ok=True)
+            save_downscaled_image(im=im, target_size=target_size, scale=scale, path=downscaled_path)
+
+        return str(downscaled_path)
+
+    except Exception as e:
+        warn(f"image [{image_path}] could not be resampled, embedding it as it is: {e}", nesting_level=nesting_level)
+        return image_path
+
+
+''' resample an image to the target size and write it atomically in the format of the source
+    the dpi is scaled with the pixels, so the image keeps its size in inches, the exif data (orientation) and the color profile are kept
+'''
+def save_downscaled_image(im, target_size, scale, path):
+    from PIL import Image
+
+    image_format = im.format
+    save_options = {}
+    if 'dpi' in im.info:
+        save_options['dpi'] = tuple(float(d) * scale for d in im.info['dpi'])
+
+    if im.info.get('icc_profile'):
+        save_options['icc_profile'] = im.info['icc_profile']
+
+    if image_format == 'JPEG':
+        # jpeg decoding can scale down by powers of two on its own, which is a lot faster than decoding the full image
+        im.draft(im.mode, target_size)
+        save_options = {**save_options, 'quality': IMAGE_DOWNSCALING['jpeg-quality'], 'optimize': True, 'progressive': True}
+        if im.info.get('exif'):
+            save_options['exif'] = im.info['exif']
+
+    elif image_format == 'WEBP':
+        save_options['quality'] = IMAGE_DOWNSCALING['jpeg-quality']
+
+    else:
+        save_options['optimize'] = True
+
+    # palette images are resampled in full color, they can not be interpolated
+    if im.mode in ['P', '1']:
+        im = im.convert('RGBA' if 'transparency' in im.info else 'RGB')
+
+    resampled = im.resize(target_size, Image.LANCZOS)
+
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}-{threading.get_ident()}{path.suffix}")
+    resampled.save(tmp_path, format=image_format, **save_options)
+    os.replace(tmp_path, path)
+
+
+# the formats resampled images are written back in, other formats (gif, svg ..) are embedded as they are
+DOWNSCALABLE_FORMATS = ['JPEG', 'PNG', 'WEBP']
+
+# an image is resampled only if it is at least this much larger than needed, a slightly larger image is not worth a lossy recompression
+DOWNSCALE_THRESHOLD = 0.8
+
+IMAGE_DOWNSCALING = {'images-dir': None, 'target-dpi': 0, 'jpeg-quality': 85}
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 
+import copy
 import inspect
 
 from helper.config_service import ConfigService
+from helper.interchange import format_dict, parsed_format
 from helper.logger import *
 from doc.docx_util import *
 
@@ -363,6 +365,10 @@ class DocxPdfSection(DocxSectionBase):
         if 'contents' in self._section_data:
             if self._section_data['contents'] is not None and 'images' in self._section_data['contents']:
                 for i, image in enumerate(self._section_data['contents']['images']):
+                    image_path = pdf_section_image_path(image=image, nesting_level=nesting_level+1)
+                    if image_path is None:
+                        continue
+
                     if self.page_bg == True:
                         # paragraph_attributes = {'breakbefore': 'page'}
                         paragraph_attributes = {}
@@ -374,7 +380,7 @@ class DocxPdfSection(DocxSectionBase):
                         self.process_pdf_page_header_footer(docx_section=docx_section, nesting_level=nesting_level+1)
 
                         # the image should go as a background
-                        add_background_image_to_header(docx_section=docx_section, image_path=image['path'], width=docx_section.page_width.inches, height=docx_section.page_height.inches, nesting_level=nesting_level+1)
+                        add_background_image_to_header(docx_section=docx_section, image_path=image_path, width=docx_section.page_width.inches, height=docx_section.page_height.inches, nesting_level=nesting_level+1)
 
                     else:
                         paragraph_attributes = {}
@@ -389,7 +395,7 @@ class DocxPdfSection(DocxSectionBase):
                         image_width_in_inches, image_height_in_inches = fit_width_height(fit_within_width=fit_within_width, fit_within_height=fit_within_height, width_to_fit=image_width_in_inches, height_to_fit=image_height_in_inches, nesting_level=nesting_level+1)
 
                         ii_dict = {
-                            'file-path': image['path'],
+                            'file-path': image_path,
                             'image-width': image_width_in_inches,
                             'image-height': image_height_in_inches,
                             'type': 'inline',
@@ -1114,18 +1120,19 @@ class Cell(object):
 
             self.formatted_value = self.value.get('formattedValue', '')
 
-            self.effective_format = CellFormat(cell_repr=self, format_dict=self.value.get('effectiveFormat'), nesting_level=nesting_level+1)
+            # formats are parsed once per entry of the document format table and copied for the cell
+            self.effective_format = parsed_format(self.value.get('effectiveFormat'), lambda effective_format_dict: CellFormat(cell_repr=self, format_dict=effective_format_dict, nesting_level=nesting_level+1)).copy(cell_repr=self)
 
             for text_format_run in self.value.get('textFormatRuns', []):
                 self.text_format_runs.append(TextFormatRun(cell_repr=self, run_dict=text_format_run, default_format=self.effective_format.text_format.source, nesting_level=nesting_level+1))
 
             # presence of userEnteredFormat makes the cell non-empty
             if 'userEnteredFormat' in self.value:
-                self.user_entered_format = CellFormat(cell_repr=self, format_dict=self.value.get('userEnteredFormat'), nesting_level=nesting_level+1)
+                self.user_entered_format = parsed_format(self.value.get('userEnteredFormat'), lambda user_entered_format_dict: CellFormat(cell_repr=self, format_dict=user_entered_format_dict, nesting_level=nesting_level+1)).copy(cell_repr=self)
                 self.is_empty = False
 
                 # HACK: handle background-color - if user_entered_format does not have backgroundColor, omit backgroundColor from effective_format
-                if 'backgroundColor' in self.value.get('userEnteredFormat'):
+                if 'backgroundColor' in format_dict(self.value.get('userEnteredFormat')):
                     self.effective_format.bgcolor = self.user_entered_format.bgcolor
 
             else:
@@ -1620,6 +1627,14 @@ class CellFormat(object):
                 self.bgcolor_style = RgbColor(bgcolor_style_dict.get('rgbColor'))
 
 
+    ''' a copy of a (shared) parsed format for a cell, the cell replaces parts of it but never modifies them
+    '''
+    def copy(self, cell_repr):
+        cell_format = copy.copy(self)
+        cell_format.cell_repr = cell_repr
+        return cell_format
+
+
     ''' attributes dict for TableCellProperties
     '''
     def table_cell_attributes(self, cell_merge_spec, force_halign=False, angle=0):
@@ -12,8 +12,10 @@ import string
 import random
 import inspect
 import requests
+import threading
 import importlib
 import traceback
+import subprocess
 
 from copy import deepcopy
 from pathlib import Path
@@ -21,7 +23,6 @@ from PIL import Image
 from lxml import etree
 
 import matplotlib
-from matplotlib import font_manager
 
 from docx import Document, section, document, table
 from docx.oxml import OxmlElement, parse_xml, ns
@@ -44,6 +45,9 @@ from googleapiclient.http import MediaIoBaseDownload
 
 from ggle.google_services import GoogleServices
 from helper.config_service import ConfigService
+from helper.file_hash import file_content_hash
+from helper.font_index import FontIndex
+from helper.image_downscaler import downscaled_image_path
 from helper.logger import *
 
 if sys.platform in ['win32', 'darwin']:
@@ -237,6 +241,46 @@ def is_paragraph(container, nesting_level=0):
 # --------------------------------------------------------------------------------------------------------------------------------------------
 # pictures, background image
 
+''' the path of the file an image of a pdf section is added into the document from
+	docx can not embed pdf or svg, so a pdf page embedded as it is (page-format pdf) is rasterized to png at the dpi of the section (pdf-page-dpi for documents without one)
+'''
+def pdf_section_image_path(image, nesting_level=0):
+	if image.get('format') != 'pdf':
+		return image['path']
+
+	return pdf_page_to_file(pdf_path=image['path'], page=image['page'], output_format='png', dpi=image.get('dpi') or ConfigService()._pdf_page_dpi, nesting_level=nesting_level)
+
+
+''' convert a page (1-based) of a pdf into a png (at dpi) file with pdftocairo, returns the path of the file or None if the conversion failed
+	the files are kept in output-dir/tmp/pages keyed by the pdf content, page, format and dpi, so a page is converted only once
+'''
+def pdf_page_to_file(pdf_path, page, output_format, dpi=None, nesting_level=0):
+	dpi = dpi or DPI
+	pages_dir = ConfigService()._temp_dir / 'pages'
+	pages_dir.mkdir(parents=True, exist_ok=True)
+	page_path = pages_dir / f"{file_content_hash(pdf_path)}-{page}-{dpi}.{output_format}"
+	if page_path.exists():
+		return str(page_path)
+
+	trace(f"converting page [{page}] of [{pdf_path}] to [{output_format}]", nesting_level=nesting_level)
+	tmp_path = page_path.with_name(f"{page_path.stem}.{os.getpid()}-{threading.get_ident()}.{output_format}")
+
+	# with -singlefile pdftocairo adds the extension itself
+	command = [PDFTOCAIRO_EXECUTABLE, f"-{output_format}", '-r', str(dpi), '-singlefile', '-f', str(page), '-l', str(page), str(pdf_path), str(tmp_path.with_suffix(''))]
+	try:
+		result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+		if result.returncode != 0 or not tmp_path.exists():
+			warn(f"page [{page}] of [{pdf_path}] could not be converted to [{output_format}]: {result.stderr.decode('utf-8', 'ignore').strip()}", nesting_level=nesting_level)
+			return None
+
+	except OSError as e:
+		warn(f"page [{page}] of [{pdf_path}] could not be converted to [{output_format}], is poppler installed? {e}", nesting_level=nesting_level)
+		return None
+
+	os.replace(tmp_path, page_path)
+	return str(page_path)
+
+
 ''' insert image into a container
 '''
 def insert_image(container, inline_image, container_width, container_height, bookmark_dict={}, nesting_level=0):
@@ -319,7 +363,9 @@ def insert_cell_image(cell, inline_image, container_width, container_height, nes
     # run.text = ' '
     # zero_paragraph_spacing(paragraph=paragraph, nesting_level=nesting_level)
 
-    shape = run.add_picture(inline_image.file_path, width=Inches(adjusted_image_width), height=Inches(adjusted_image_height))
+    # the image is embedded no larger than it is displayed
+    picture_path = downscaled_image_path(image_path=inline_image.file_path, width_in_inches=adjusted_image_width, height_in_inches=adjusted_image_height, nesting_level=nesting_level)
+    shape = run.add_picture(picture_path, width=Inches(adjusted_image_width), height=Inches(adjusted_image_height))
     inline = shape._inline
     rId = inline.graphic.graphicData.pic.blipFill.blip.embed
     cx, cy = inline.extent.cx, inline.extent.cy
@@ -568,8 +614,9 @@ def create_cell_background(cell, inline_image, container_width, container_height
 	# run.text = ' '
 	# zero_paragraph_spacing(paragraph=paragraph, nesting_level=nesting_level)
 
-	# 2. Add the picture (initially inline)
-	picture = run.add_picture(inline_image.file_path, width=Inches(container_width), height=Inches(container_height))
+	# 2. Add the picture (initially inline), no larger than the cell it is stretched over
+	picture_path = downscaled_image_path(image_path=inline_image.file_path, width_in_inches=container_width, height_in_inches=container_height, nesting_level=nesting_level)
+	picture = run.add_picture(picture_path, width=Inches(container_width), height=Inches(container_height))
 
 	# 3. Get the XML element and change it from 'inline' to 'anchor'
 	inline = picture._inline
@@ -2153,6 +2200,21 @@ def download_file_from_drive(drive_service, url, title, tmp_dir, nesting_level=0
         return None
 
 
+''' the shared keep-alive http session used for all web downloads, connections are pooled per host
+'''
+def http_session():
+    global HTTP_SESSION
+    with HTTP_SESSION_LOCK:
+        if HTTP_SESSION is None:
+            config_service = ConfigService()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=config_service._http_pool_hosts, pool_maxsize=config_service._http_pool_connections_per_host)
+            HTTP_SESSION = requests.Session()
+            HTTP_SESSION.mount('http://', adapter)
+            HTTP_SESSION.mount('https://', adapter)
+
+    return HTTP_SESSION
+
+
 ''' download a file from a web url and return a dict
     {'file-name': file-name, 'file-type': file-type, 'file-path': local_path)}
 '''
@@ -2178,9 +2240,20 @@ def download_file_from_web(url, tmp_dir, nesting_level=0):
             trace(f"file existing   [{file_url}]", nesting_level=nesting_level)
             # pass
         else:
-            file_data = requests.get(file_url).content
-            with open(local_path, 'wb') as handler:
-                handler.write(file_data)
+            # written to a temporary name first, an interrupted download must not be taken for the file in a later run
+            tmp_path = local_path.with_name(f"{local_path.name}.{os.getpid()}-{threading.get_ident()}.part")
+            try:
+                with http_session().get(file_url, stream=True, timeout=ConfigService()._http_timeout_seconds) as response:
+                    response.raise_for_status()
+                    with open(tmp_path, 'wb') as handler:
+                        for block in response.iter_content(ConfigService()._http_chunk_size_kb * 1024):
+                            handler.write(block)
+
+                os.replace(tmp_path, local_path)
+
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
 
             trace(f"file downloaded [{file_url}]", nesting_level=nesting_level)
 
@@ -2611,14 +2684,8 @@ def get_font_to_be_used(font_asked, nesting_level=0):
 ''' check whether a font is installed or not
 '''
 def is_font_installed(font_name):
-    # Get a list of all available system fonts
-    available_fonts = font_manager.findSystemFonts(fontpaths=None, fontext='ttf')
-    
-    # Extract the actual names of the fonts
-    font_names = [font_manager.FontProperties(fname=f).get_name() for f in available_fonts]
-    
-    # Check if your font is in the list (case-insensitive)
-    return font_name.lower() in [f.lower() for f in font_names]
+    # the system fonts are scanned only once, see FontIndex
+    return FontIndex().has_font(font_name)
 
 
 ''' parse page directive string like
@@ -3023,9 +3090,16 @@ EMU_PER_PT = 12700
 # emu per pt
 INCHES_PER_PT = 72
 
+# the shared http session, created on first use
+HTTP_SESSION = None
+HTTP_SESSION_LOCK = threading.Lock()
+
 # default DPI
 DPI = 72
 
+# poppler's pdftocairo rasterizes pdf pages (page-format pdf of pdf sections) into png
+PDFTOCAIRO_EXECUTABLE = 'pdftocairo'
+
 # pixel per inch for row height calculation
 PIXEL_PER_INCH_FOR_ROW_HEIGHT = 96
 
@@ -30,14 +30,23 @@ class ConfigService:
 
         self._google_cred_json_path = Path(_config_dict.get('google-cred', None)).resolve()
         self._json_list = _config_dict.get('jsons', [])
+        self._interchange_format = _config_dict.get('interchange-format', 'json')
         self._data_dir = Path(_config_dict.get('data-dir', '../data')).resolve()
         self._output_dir = Path(_config_dict.get('output-dir', '../../out')).resolve()
 
         self._temp_dir = self._output_dir / 'tmp'
         self._temp_dir.mkdir(parents=True, exist_ok=True)
 
+        self._http_pool_hosts = _config_dict.get('http-pool-hosts', 10)
+        self._http_pool_connections_per_host = _config_dict.get('http-pool-connections-per-host', 8)
+        self._http_timeout_seconds = _config_dict.get('http-timeout-seconds', 60)
+        self._http_chunk_size_kb = _config_dict.get('http-chunk-size-kb', 1024)
+
         self._docx_template = Path(_config_dict.get('docx-template', None)).resolve()
         self._generate_pdf = _config_dict.get('generate-pdf', True)
+        self._pdf_page_dpi = _config_dict.get('pdf-page-dpi', 72)
+        self._image_target_dpi = _config_dict.get('image-target-dpi', 200)
+        self._image_jpeg_quality = _config_dict.get('image-jpeg-quality', 85)
 
         self.process_spec_ymls = _config_dict.get('process-spec-ymls', False)
 
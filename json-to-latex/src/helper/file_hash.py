@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+'''
+content hashes of local files (pdfs, images), used to key the caches of things derived from them
+this module is repeated in every package
+'''
+
+import os
+import hashlib
+
+''' the content hash of a file, a file is hashed only once per run
+'''
+def file_content_hash(file_path):
+    stat = os.stat(file_path)
+    hash_key = (str(file_path), stat.st_size, stat.st_mtime_ns)
+    if hash_key not in FILE_HASH_CACHE:
+        file_hash = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                file_hash.update(chunk)
+
+        FILE_HASH_CACHE[hash_key] = file_hash.hexdigest()[:24]
+
+    return FILE_HASH_CACHE[hash_key]
+
+
+
+# content hashes of the files keyed by (path, size, mtime)
+FILE_HASH_CACHE = {}
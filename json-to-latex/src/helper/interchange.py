@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+'''
+the documents handed from gsheet-to-json to the json-to-* renderers are either json or msgpack
+the msgpack form is a stream of records
+    ['header', INTERCHANGE_FORMAT_NAME, INTERCHANGE_FORMAT_VERSION]
+    ['keys', [key, ...]]        keys interned from here on, a dict key in later records is the index of the key in the key table
+    ['specs', {...}]            everything in the document that comes before the sections
+    ['formats', [{...}, ...]]   formats added to the format table from here on, cells refer to their formats by index in the table
+    ['section', {...}]          one record per section
+    ['end']
+the key table is built incrementally, so a writer never needs to hold more than one section
+this is the reading part of the interchange module of gsheet-to-json, which also writes and converts documents
+'''
+
+import json
+from pathlib import Path
+
+''' the path of a document for an interchange format
+'''
+def document_path(output_dir, name, interchange_format='json'):
+    return Path(output_dir) / f"{name}{INTERCHANGE_FILE_EXTENSIONS.get(interchange_format, '.json')}"
+
+
+''' read a document (json or msgpack, decided by the file extension) into a dict
+'''
+def read_document(path):
+    path = Path(path)
+    if path.suffix != INTERCHANGE_FILE_EXTENSIONS['msgpack']:
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    import msgpack
+
+    # the maps are decoded with the key table as it is at that point of the stream
+    key_table = []
+    object_pairs_hook = lambda pairs: {key_table[k]: v for k, v in pairs}
+
+    document = None
+    with open(path, 'rb') as f:
+        unpacker = msgpack.Unpacker(f, raw=False, strict_map_key=False, object_pairs_hook=object_pairs_hook, max_buffer_size=0)
+        for record in unpacker:
+            record_type = record[0]
+            if record_type == 'header':
+                if record[1:] != [INTERCHANGE_FORMAT_NAME, INTERCHANGE_FORMAT_VERSION]:
+                    raise ValueError(f"[{path}] is not a supported interchange document {record[1:]}")
+
+            elif record_type == 'keys':
+                key_table.extend(record[1])
+
+            elif record_type == 'specs':
+                document = dict(record[1])
+                document['sections'] = []
+
+            elif record_type == 'formats':
+                document.setdefault('formats', []).extend(record[1])
+
+            elif record_type == 'section':
+                document['sections'].append(record[1])
+
+            elif record_type == 'end':
+                return document
+
+    raise ValueError(f"[{path}] is incomplete")
+
+
+''' the format table of the document being rendered, cells refer to their formats by index in it
+'''
+def set_format_table(formats):
+    FORMAT_TABLE['formats'] = formats or []
+    FORMAT_TABLE['parsed'] = {}
+
+
+''' a cell format as a dict - either given inline or as an index in the format table
+'''
+def format_dict(format_value):
+    if isinstance(format_value, int):
+        return FORMAT_TABLE['formats'][format_value]
+
+    return format_value
+
+
+''' the parsed form of a cell format, a format in the format table is parsed only once and the same object is returned for every cell referring to it
+    callers that modify the parsed format must work on a copy
+'''
+def parsed_format(format_value, parse_function):
+    if not isinstance(format_value, int):
+        return parse_function(format_value)
+
+    parsed = FORMAT_TABLE['parsed'].get(format_value)
+    if parsed is None:
+        parsed = parse_function(FORMAT_TABLE['formats'][format_value])
+        FORMAT_TABLE['parsed'][format_value] = parsed
+
+    return parsed
+
+
+
+INTERCHANGE_FORMAT_NAME = 'gsheet-document'
+INTERCHANGE_FORMAT_VERSION = 1
+
+INTERCHANGE_FILE_EXTENSIONS = {'json': '.json', 'msgpack': '.msgpack'}
+
+FORMAT_TABLE = {'formats': [], 'parsed': {}}
@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 
+import copy
 import json
 import importlib
 import inspect
 from pprint import pprint
  
 from latex.latex_util import *
+from helper.image_downscaler import downscaled_image_path
+from helper.interchange import parsed_format
 from helper.logger import *
 
 #   ----------------------------------------------------------------------------------------------------------------
@@ -321,7 +324,11 @@ class LatexPdfSection(LatexSectionBase):
                     # adjust image as per section width/height
                     image_width_in_inches, image_height_in_inches = fit_width_height(fit_within_width=self.section_width, fit_within_height=self.section_height, width_to_fit=image['width'], height_to_fit=image['height'])
 
-                    latex_code = f"\includegraphics[width={image_width_in_inches}in]{{{os_specific_path(image['path'])}}}"
+                    # a pdf page embedded as it is, the page is picked out of the pdf
+                    if image.get('format') == 'pdf':
+                        latex_code = f"\includegraphics[page={image['page']},width={image_width_in_inches}in]{{{os_specific_path(image['path'])}}}"
+                    else:
+                        latex_code = f"\includegraphics[width={image_width_in_inches}in]{{{os_specific_path(image['path'])}}}"
 
                     image_lines.append(latex_code)
 
@@ -970,14 +977,15 @@ class Cell(object):
             self.formatted_value = self.value.get('formattedValue', '')
 
             # self.effective_format = CellFormat(format_dict=self.value.get('effectiveFormat'), default_format=self.default_format)
-            self.effective_format = CellFormat(format_dict=self.value.get('effectiveFormat'))
+            # formats are parsed once per entry of the document format table and copied for the cell
+            self.effective_format = parsed_format(self.value.get('effectiveFormat'), lambda effective_format_dict: CellFormat(format_dict=effective_format_dict)).copy()
 
             for text_format_run in self.value.get('textFormatRuns', []):
                 self.text_format_runs.append(TextFormatRun(run_dict=text_format_run, default_format=self.effective_format.text_format.source))
 
             # presence of userEnteredFormat makes the cell non-empty
             if 'userEnteredFormat' in self.value:
-                self.user_entered_format = CellFormat(format_dict=self.value.get('userEnteredFormat'))
+                self.user_entered_format = parsed_format(self.value.get('userEnteredFormat'), lambda user_entered_format_dict: CellFormat(format_dict=user_entered_format_dict)).copy()
                 self.is_empty = False
             else:
                 self.user_entered_format = None
@@ -1763,7 +1771,9 @@ class ImageValue(CellValue):
             # treat it as if image mode is 3
             pass
 
-        latex_code = f"\includegraphics[width={image_width_in_inches}in]{{{os_specific_path(self.value['path'])}}}"
+        # the image is embedded no larger than it is displayed
+        image_path = downscaled_image_path(image_path=self.value['path'], width_in_inches=image_width_in_inches, height_in_inches=image_height_in_inches)
+        latex_code = f"\includegraphics[width={image_width_in_inches}in]{{{os_specific_path(image_path)}}}"
 
         return latex_code
 
@@ -1826,6 +1836,12 @@ class CellFormat(object):
             self.text_format = None
 
 
+    ''' a copy of a (shared) parsed format for a cell, the cell replaces parts of it but never modifies them
+    '''
+    def copy(self):
+        return copy.copy(self)
+
+
 
 ''' gsheet cell borders object wrapper
 '''
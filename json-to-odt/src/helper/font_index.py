@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+'''
+'''
+
+import os
+import sys
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+from helper.config_service import ConfigService
+from helper.logger import *
+
+class FontIndex:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(FontIndex, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, nesting_level=0):
+        if self._initialized:
+            return
+
+        self._index_path = ConfigService()._temp_dir / 'font-index.json'
+        self._lock = threading.Lock()
+        self._families = None
+
+        self._initialized = True
+
+
+    ''' the index is a dict keyed by lowercase family name
+        {'name': family name, 'files': [{'path': font file, 'style': normal/italic/oblique, 'weight': weight}, ...]}
+        it is built once per process and persisted, the persisted index is reused as long as the font directories are unchanged
+    '''
+    def families(self, nesting_level=0):
+        with self._lock:
+            if self._families is None:
+                signature = self.font_dirs_signature()
+                self._families = self.load_index(signature=signature, nesting_level=nesting_level)
+                if self._families is None:
+                    self._families = self.build_index(nesting_level=nesting_level)
+                    self.save_index(signature=signature, nesting_level=nesting_level)
+
+            return self._families
+
+
+    ''' whether a font family is installed (case-insensitive)
+    '''
+    def has_font(self, font_name):
+        return font_name.lower() in self.families()
+
+
+    ''' the index entry of a font family, None if the family is not installed
+    '''
+    def font_family(self, font_name):
+        return self.families().get(font_name.lower())
+
+
+    ''' the directories fonts are looked up in, the same ones matplotlib's findSystemFonts scans
+        they are listed here so that a persisted index can be validated without importing matplotlib
+    '''
+    def font_dirs(self):
+        if sys.platform == 'win32':
+            font_dirs = [Path(os.environ.get('WINDIR', 'C:/WINDOWS')) / 'Fonts']
+            font_dirs = font_dirs + [Path(os.environ[var]) / 'Microsoft/Windows/Fonts' for var in ['LOCALAPPDATA', 'APPDATA'] if var in os.environ]
+        elif sys.platform == 'darwin':
+            font_dirs = X11_FONT_DIRS + OSX_FONT_DIRS
+        else:
+            font_dirs = X11_FONT_DIRS
+
+        return sorted(set(str(Path(font_dir).expanduser()) for font_dir in font_dirs))
+
+
+    ''' a hash of the mtimes of the font directories and all their sub-directories, a font installed or removed anywhere changes it
+    '''
+    def font_dirs_signature(self):
+        dir_mtimes = []
+        for font_dir in self.font_dirs():
+            for root, _, _ in os.walk(font_dir):
+                try:
+                    dir_mtimes.append(f"{root}:{os.stat(root).st_mtime_ns}")
+                except OSError:
+                    pass
+
+        return hashlib.sha1('\n'.join(dir_mtimes).encode('utf-8')).hexdigest()
+
+
+    ''' read the persisted index if it was built for the same font directories
+    '''
+    def load_index(self, signature, nesting_level=0):
+        if not self._index_path.exists():
+            return None
+
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                persisted = json.load(f)
+
+            if persisted.get('signature') == signature:
+                trace(f"font index loaded from [{self._index_path}]", nesting_level=nesting_level)
+                return persisted['families']
+
+            trace(f"font directories changed, font index will be rebuilt", nesting_level=nesting_level)
+
+        except Exception as e:
+            warn(f"font index could not be read, it will be rebuilt: {e}", nesting_level=nesting_level)
+
+        return None
+
+
+    ''' write the index atomically, must be called holding the lock
+    '''
+    def save_index(self, signature, nesting_level=0):
+        index_tmp_path = self._index_path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            with open(index_tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'signature': signature, 'families': self._families}, f, indent=2)
+
+            os.replace(index_tmp_path, self._index_path)
+
+        except Exception as e:
+            warn(f"font index could not be saved: {e}", nesting_level=nesting_level)
+
+
+    ''' scan all system fonts once and group the font files by family
+    '''
+    def build_index(self, nesting_level=0):
+        from matplotlib import font_manager
+
+        trace(f"building font index", nesting_level=nesting_level)
+        families = {}
+        for font_path in font_manager.findSystemFonts(fontpaths=None, fontext='ttf'):
+            try:
+                font_entry = font_manager.ttfFontProperty(font_manager.get_font(font_path))
+            except Exception:
+                continue
+
+            family = families.setdefault(font_entry.name.lower(), {'name': font_entry.name, 'files': []})
+            family['files'].append({'path': font_path, 'style': font_entry.style, 'weight': font_entry.weight})
+
+        trace(f"font index built with [{len(families)}] font families", nesting_level=nesting_level)
+        return families
+
+
+# font directories on linux/unix
+X11_FONT_DIRS = [
+    '/usr/X11R6/lib/X11/fonts/TTF/',
+    '/usr/X11/lib/X11/fonts',
+    '/usr/share/fonts/',
+    '/usr/local/share/fonts/',
+    '/usr/lib/openoffice/share/fonts/truetype/',
+    str(Path(os.environ.get('XDG_DATA_HOME') or Path.home() / '.local/share') / 'fonts'),
+    str(Path.home() / '.fonts'),
+]
+
+# font directories on macos
+OSX_FONT_DIRS = [
+    '/Library/Fonts/',
+    '/Network/Library/Fonts/',
+    '/System/Library/Fonts/',
+    '/opt/local/share/fonts',
+    str(Path.home() / 'Library/Fonts'),
+]
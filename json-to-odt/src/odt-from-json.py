@@ -3,11 +3,12 @@
 '''
 
 import time
-import json
 import argparse
 
 from ggle.google_services import GoogleServices
 from helper.config_service import ConfigService
+from helper.image_downscaler import set_image_downscaling
+from helper.interchange import document_path, read_document, set_format_table
 from helper.logger import *
 from odt.odt_helper import OdtHelper
 from odt.odt_util import *
@@ -22,6 +23,9 @@ class OdtFromJson(object):
 		# configuration
 		config_service = ConfigService(config_file=config_file, nesting_level=nesting_level)
 
+		# images are resampled to the size they are displayed at into the temp dir
+		set_image_downscaling(images_dir=config_service._temp_dir / 'images', target_dpi=config_service._image_target_dpi, jpeg_quality=config_service._image_jpeg_quality)
+
 		# initialize GoogleServices
 		google_services = GoogleServices(json_path=config_service._google_cred_json_path, nesting_level=nesting_level)
 
@@ -31,10 +35,10 @@ class OdtFromJson(object):
 
 		# process jsons one by one
 		for json_file in config_service._json_list:
-			config_service._input_json_path = config_service._output_dir / f"{json_file}.json"
+			config_service._input_json_path = document_path(output_dir=config_service._output_dir, name=json_file, interchange_format=config_service._interchange_format)
 			config_service._output_odt_path = config_service._output_dir / f"{json_file}.odt"
-			with open(config_service._input_json_path, "r") as f:
-				self._data = json.load(f)
+			self._data = read_document(config_service._input_json_path)
+			set_format_table(self._data.get('formats'))
 
 			# odt-helper
 			odt_helper = OdtHelper(spec_list=self._data['specs'], nesting_level=nesting_level)
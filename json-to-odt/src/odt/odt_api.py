@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 
+import copy
 import inspect
 
 from helper.config_service import ConfigService
+from helper.image_downscaler import downscaled_image_path
+from helper.interchange import format_dict, parsed_format
 from odt.odt_util import *
 from helper.logger import *
 
@@ -368,6 +371,10 @@ class OdtPdfSection(OdtSectionBase):
         if 'contents' in self._section_data:
             if self._section_data['contents'] and 'images' in self._section_data['contents']:
                 for i, image in enumerate(self._section_data['contents']['images']):
+                    image_path = pdf_section_image_path(image=image, nesting_level=nesting_level+1)
+                    if image_path is None:
+                        continue
+
                     # we need to set bookmark for each pdf page if the section has a bookmark arrached with it, we just append page number
                     this_image_bookmark = None
                     if self.bookmark_dict is not None:
@@ -384,7 +391,7 @@ class OdtPdfSection(OdtSectionBase):
                         self.master_page = create_master_page(self._odt, first_section=self.first_section, document_index=self.document_index, master_page_name=master_page_name, page_spec=self.page_spec, margin_spec=self.margin_spec, orientation=self.orientation, page_num_format=self.page_num_format, nesting_level=nesting_level+1)
                         master_page_name = self.master_page.getAttribute('name')
                         # handle background image
-                        add_background_image_to_master_page(odt=self._odt, master_page=self.master_page, background_image_path=image['path'], nesting_level=nesting_level+1)
+                        add_background_image_to_master_page(odt=self._odt, master_page=self.master_page, background_image_path=image_path, nesting_level=nesting_level+1)
 
                         paragraph_style_name = f"{self.master_page_name}-P-{str(i).zfill(3)}"
                         paragraph = create_paragraph_with_masterpage(odt=self._odt, style_name=paragraph_style_name, master_page_name=master_page_name, nesting_level=nesting_level+1)
@@ -399,7 +406,7 @@ class OdtPdfSection(OdtSectionBase):
                     else:
                         # we need to create an inline-image object
                         ii_dict = {
-                            'file-path': image['path'],
+                            'file-path': image_path,
                             'image-width': image['width'],
                             'image-height': image['height'],
                             'type': 'inline',
@@ -412,7 +419,7 @@ class OdtPdfSection(OdtSectionBase):
 
                         graphic_properties_attributes = inline_image.graphic_properties_attributes(nesting_level=nesting_level+1)
                         frame_attributes = inline_image.frame_attributes(container_width=self.section_width, container_height=self.section_height - PDF_PAGE_HEIGHT_OFFSET, nesting_level=nesting_level+1)
-                        draw_frame = create_image_frame(odt=self._odt, picture_path=image['path'], frame_attributes=frame_attributes, graphic_properties_attributes=graphic_properties_attributes, nesting_level=nesting_level+1)
+                        draw_frame = create_image_frame(odt=self._odt, picture_path=image_path, frame_attributes=frame_attributes, graphic_properties_attributes=graphic_properties_attributes, nesting_level=nesting_level+1)
 
                         style_name = create_paragraph_style(self._odt, style_attributes=style_attributes, paragraph_attributes=paragraph_attributes, text_attributes=text_attributes, nesting_level=nesting_level+1)
                         paragraph = create_paragraph(self._odt, style_name, nesting_level=nesting_level+1)
@@ -1007,18 +1014,19 @@ class Cell(object):
 
             self.formatted_value = self.value.get('formattedValue', '')
 
-            self.effective_format = CellFormat(cell_repr=self, format_dict=self.value.get('effectiveFormat'), nesting_level=nesting_level+1)
+            # formats are parsed once per entry of the document format table and copied for the cell
+            self.effective_format = parsed_format(self.value.get('effectiveFormat'), lambda effective_format_dict: CellFormat(cell_repr=self, format_dict=effective_format_dict, nesting_level=nesting_level+1)).copy(cell_repr=self)
 
             for text_format_run in self.value.get('textFormatRuns', []):
                 self.text_format_runs.append(TextFormatRun(cell_repr=self, run_dict=text_format_run, default_format=self.effective_format.text_format.source, nesting_level=nesting_level+1))
 
             # presence of userEnteredFormat makes the cell non-empty
             if 'userEnteredFormat' in self.value:
-                self.user_entered_format = CellFormat(cell_repr=self, format_dict=self.value.get('userEnteredFormat'), nesting_level=nesting_level+1)
+                self.user_entered_format = parsed_format(self.value.get('userEnteredFormat'), lambda user_entered_format_dict: CellFormat(cell_repr=self, format_dict=user_entered_format_dict, nesting_level=nesting_level+1)).copy(cell_repr=self)
                 self.is_empty = False
 
                 # HACK: handle background-color - if user_entered_format does not have backgroundColor, omit backgroundColor from effective_format
-                if 'backgroundColor' in self.value.get('userEnteredFormat'):
+                if 'backgroundColor' in format_dict(self.value.get('userEnteredFormat')):
                     self.effective_format.bgcolor = self.user_entered_format.bgcolor
 
             else:
@@ -1100,13 +1108,17 @@ class Cell(object):
             for inline_image in self.inline_images:
                 # now if the background does not have any position, it is to be trated as a background image
                 if inline_image.type == 'background':
-                    background_image_style = create_background_image_style(odt=odt, picture_path=inline_image.file_path, opacity=inline_image.opacity, nesting_level=nesting_level+1)
+                    # the background is stretched over the cell
+                    picture_path = downscaled_image_path(image_path=inline_image.file_path, width_in_inches=self.effective_cell_width, height_in_inches=self.effective_cell_height, nesting_level=nesting_level+1)
+                    background_image_style = create_background_image_style(odt=odt, picture_path=picture_path, opacity=inline_image.opacity, nesting_level=nesting_level+1)
 
                 # the image is positioned, it is to be positioned as a non-bg image
                 elif inline_image.type == 'inline':
                     graphic_properties_attributes = inline_image.graphic_properties_attributes(nesting_level=nesting_level+1)
                     frame_attributes = inline_image.frame_attributes(container_width=self.effective_cell_width, container_height=self.effective_cell_height, nesting_level=nesting_level+1)
-                    self.image_frames.append(create_image_frame(odt=odt, picture_path=inline_image.file_path, frame_attributes=frame_attributes, graphic_properties_attributes=graphic_properties_attributes, nesting_level=nesting_level+1))
+                    image_width_in_inches, image_height_in_inches = inline_image.adjusted_dimension(container_width=self.effective_cell_width, container_height=self.effective_cell_height, nesting_level=nesting_level+1)
+                    picture_path = downscaled_image_path(image_path=inline_image.file_path, width_in_inches=image_width_in_inches, height_in_inches=image_height_in_inches, nesting_level=nesting_level+1)
+                    self.image_frames.append(create_image_frame(odt=odt, picture_path=picture_path, frame_attributes=frame_attributes, graphic_properties_attributes=graphic_properties_attributes, nesting_level=nesting_level+1))
 
                 else:
                     warn(f"invalid inline-image type [{inline_image.type}]", nesting_level=nesting_level+1)
@@ -1439,7 +1451,11 @@ class ImageValue(CellValue):
         graphic_properties_attributes = inline_image.graphic_properties_attributes(nesting_level=nesting_level+1)
         frame_attributes = inline_image.frame_attributes(container_width=container_width, container_height=container_height, nesting_level=nesting_level+1)
         # frame_attributes = inline_image.frame_attributes(nesting_level=nesting_level+1)
-        image_frame = create_image_frame(odt=odt, picture_path=inline_image.file_path, frame_attributes=frame_attributes, graphic_properties_attributes=graphic_properties_attributes, nesting_level=nesting_level+1)
+
+        # the image is embedded no larger than it is displayed
+        image_width_in_inches, image_height_in_inches = inline_image.adjusted_dimension(container_width=container_width, container_height=container_height, nesting_level=nesting_level+1)
+        picture_path = downscaled_image_path(image_path=inline_image.file_path, width_in_inches=image_width_in_inches, height_in_inches=image_height_in_inches, nesting_level=nesting_level+1)
+        image_frame = create_image_frame(odt=odt, picture_path=picture_path, frame_attributes=frame_attributes, graphic_properties_attributes=graphic_properties_attributes, nesting_level=nesting_level+1)
 
         paragraph.addElement(image_frame)
         container.addElement(paragraph)
@@ -1590,6 +1606,14 @@ class CellFormat(object):
                 self.bgcolor_style = RgbColor(bgcolor_style_dict.get('rgbColor'))
 
 
+    ''' a copy of a (shared) parsed format for a cell, the cell replaces parts of it but never modifies them
+    '''
+    def copy(self, cell_repr):
+        cell_format = copy.copy(self)
+        cell_format.cell_repr = cell_repr
+        return cell_format
+
+
     ''' attributes dict for Cell Text
     '''
     def text_attributes(self, angle=0, nesting_level=0):
@@ -2138,14 +2162,22 @@ class InlineImage(object):
         return attributes
 
 
-    ''' attributes dict for DrawFrame
+    ''' image width and height (in inches) as it is displayed in the container
     '''
-    def frame_attributes(self, container_width=None, container_height=None, preserve=None, nesting_level=0):
+    def adjusted_dimension(self, container_width=None, container_height=None, nesting_level=0):
         width_in_inches, height_in_inches = self.image_width, self.image_height
         if self.fit_height_to_container == True or self.fit_width_to_container == True:
             if container_width is not None and container_height is not None:
                 width_in_inches, height_in_inches, scale = fit_width_height(fit_within_width=container_width, fit_within_height=container_height, width_to_fit=self.image_width, height_to_fit=self.image_height)
 
+        return width_in_inches, height_in_inches
+
+
+    ''' attributes dict for DrawFrame
+    '''
+    def frame_attributes(self, container_width=None, container_height=None, preserve=None, nesting_level=0):
+        width_in_inches, height_in_inches = self.adjusted_dimension(container_width=container_width, container_height=container_height, nesting_level=nesting_level)
+
         attributes = {'anchortype': self.anchor_type, 'width': f"{width_in_inches}in", 'height': f"{height_in_inches}in"}
         if self.fit_height_to_container == True:
             if self.keep_aspect_ratio == True: